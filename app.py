@@ -1,10 +1,15 @@
 import os
+import uuid
 import streamlit as st
 import torch
 import warnings
 
 from src.state.Agentstate import AgentState
-from src.graph.graph_builder import setup_graph  # Importing setup_graph
+from src.graph.graph_builder import GraphHolder
+from src.state.session_store import SessionStore
+from src.graph.deadline import new_deadline
+from src.graph.profiling import profile_section, should_profile
+from src.nodes.generate_response_node import degraded_notice
 from types import SimpleNamespace
 
 # Suppress warnings
@@ -19,36 +24,49 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Profiling is opt-in per request via ?profile=1 or an X-Profile: 1 header (at most once per PROFILE_MIN_INTERVAL)
+def profiling_requested() -> bool:
+    header = st.context.headers.get("X-Profile", "") if hasattr(st, "context") else ""
+    return st.query_params.get("profile") == "1" or header == "1"
+
+
 # Helper function to detect medicine-related queries
 def is_medicine_request(text: str) -> bool:
     keywords = ['medicine', 'medication', 'drug', 'treatment', 'pill']
     return any(k in text.lower() for k in keywords)
 
 
-# 👇 Initialize LangGraph app only once
-if 'diagnosis_graph' not in st.session_state:
-    with st.spinner("Initializing LangGraph agent..."):
-        # Dummy wrapper class to hold the graph object with setup_graph
-        class GraphWrapper:
-            def __init__(self):
-                self.app = None
-                self.setup_graph()
+# 👇 Build the LangGraph app once per server process and share it across sessions
+@st.cache_resource(show_spinner="Initializing LangGraph agent...")
+def get_diagnosis_graph():
+    return GraphHolder().app
+
+
+diagnosis_graph = get_diagnosis_graph()
+
 
-            def setup_graph(self):
-                # Call your setup_graph method from graph_builder.py
-                setup_graph(self)
+# 👇 Shared, bounded session store (one per server process)
+@st.cache_resource
+def get_session_store() -> SessionStore:
+    return SessionStore(
+        db_path=os.getenv("SESSION_DB_PATH", "sessions.db"),
+        max_messages=int(os.getenv("SESSION_MAX_MESSAGES", "20")),
+        idle_seconds=float(os.getenv("SESSION_IDLE_SECONDS", "900")),
+    )
 
-        st.session_state.diagnosis_graph = GraphWrapper().app
 
+session_store = get_session_store()
 
-# 👇 Initialize chat history
-if 'chat_history' not in st.session_state:
-    st.session_state.chat_history = []
+# 👇 Session id stays server-side: anyone holding it could read the chat, so it is
+# never put in the URL (where it would end up in history, logs and shared links)
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+session_id = st.session_state.session_id
 
 st.title("🩺 Medical Diagnosis Assistant")
 
 # Display past chat messages
-for message in st.session_state.chat_history:
+for message in session_store.get(session_id):
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
 
@@ -56,7 +74,8 @@ for message in st.session_state.chat_history:
 user_input = st.chat_input("Describe your symptoms (e.g., 'I have chest pain and cough')")
 
 if user_input:
-    st.session_state.chat_history.append({"role": "user", "content": user_input})
+    conversation_history = session_store.get(session_id)
+    session_store.append(session_id, "user", user_input)
     with st.chat_message("user"):
         st.markdown(user_input)
 
@@ -69,18 +88,23 @@ if user_input:
                 "user_query": user_input,
                 "extracted_symptoms": [],
                 "similarity_score": 0.0,
-                "retrieved_disease": {},
+                "retrieved_disease": None,
                 "refined_query": "",
                 "retry_count": 0,
                 "final_response": "",
                 "medicine_request": medicine_req,
                 "medicines": [],
-                "conversation_history": [],
-                "messages": []
+                "medicine_snippet_id": None,
+                "conversation_history": conversation_history,
+                "messages": [],
+                "deadline": new_deadline(),
+                "degraded": [],
+                "speculation_id": ""
             }
 
             # 🔗 Run LangGraph
-            result: AgentState = st.session_state.diagnosis_graph.invoke(init_state)
+            with profile_section("graph", enabled=should_profile(profiling_requested())):
+                result: AgentState = diagnosis_graph.invoke(init_state)
 
             # 💬 Show final response
             st.markdown(result["final_response"])
@@ -95,12 +119,10 @@ if user_input:
                     st.subheader("📊 Internal Info")
                     st.write(f"**Similarity Score:** {result['similarity_score']:.2f}")
                     st.write(f"**Retry Count:** {result['retry_count']}")
-                    st.write(f"**Disease Found:** {result['retrieved_disease'].get('name', 'N/A')}")
+                    st.write(f"**Disease Found:** {getattr(result['retrieved_disease'], 'name', 'N/A')}")
+                    st.write(f"**Session Memory:** {session_store.metrics(session_id)['session_bytes'] / 1024:.1f} KB")
 
-            st.session_state.chat_history.append({
-                "role": "assistant",
-                "content": result["final_response"]
-            })
+            session_store.append(session_id, "assistant", result["final_response"])
 
     # Optional medicine follow-up
     if not medicine_req:
@@ -108,20 +130,21 @@ if user_input:
             with st.chat_message("assistant"):
                 with st.spinner("Fetching medicine info..."):
                     init_state["medicine_request"] = True
-                    med_result = st.session_state.diagnosis_graph.invoke(init_state)
+                    init_state["deadline"] = new_deadline()
+                    init_state["degraded"] = []
+                    with profile_section("graph_medicines", enabled=should_profile(profiling_requested())):
+                        med_result = diagnosis_graph.invoke(init_state)
 
                     if med_result["medicines"]:
                         med_response = "Here are some commonly recommended medicines:\n\n"
                         med_response += "\n".join(f"- {med}" for med in med_result["medicines"])
                     else:
                         med_response = "Sorry, couldn't find medicine info."
+                    med_response += degraded_notice(med_result)
 
                     st.markdown(med_response)
-                    st.session_state.chat_history.append({
-                        "role": "assistant",
-                        "content": med_response
-                    })
+                    session_store.append(session_id, "assistant", med_response)
 
 if st.button("🧹 Clear Chat History"):
-    st.session_state.chat_history = []
+    session_store.clear(session_id)
     st.rerun()
@@ -0,0 +1,101 @@
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Mapping, Optional, Tuple
+
+# End-to-end budget for one graph run
+DEFAULT_BUDGET_SECONDS = float(os.getenv("REQUEST_BUDGET_SECONDS", "20"))
+
+# Rough cost of each step, used to decide whether a branch still fits in the budget
+STEP_ESTIMATES = {
+    "extract_symptoms": 3.0,
+    "vector_search": 4.0,
+    "refine_query": 3.0,
+    "web_search": 8.0,
+    "generate_response": 0.1,
+    "search_medicines": 8.0,
+}
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call cannot finish before the request deadline"""
+
+
+def new_deadline(budget: Optional[float] = None) -> float:
+    """Absolute wall-clock deadline for a request starting now"""
+    return time.time() + (DEFAULT_BUDGET_SECONDS if budget is None else budget)
+
+
+def remaining(state: Mapping[str, Any]) -> float:
+    """Seconds left before the state's deadline (inf when no deadline is set)"""
+    deadline = state.get("deadline")
+    if not deadline:
+        return math.inf
+    return deadline - time.time()
+
+
+def has_budget(state: Mapping[str, Any], *steps: str) -> bool:
+    """True when the estimated cost of ``steps`` fits in the remaining budget"""
+    return remaining(state) > sum(STEP_ESTIMATES.get(s, 0.0) for s in steps)
+
+
+def timeout_for(state: Mapping[str, Any], cap: float) -> float:
+    """Per-call network timeout: ``cap`` clipped to the remaining budget"""
+    left = remaining(state)
+    if left <= 0:
+        raise DeadlineExceeded("request deadline already passed")
+    return min(cap, left)
+
+
+@contextmanager
+def budget_timeout(timeout: float, cap: float, timeout_errors: Tuple[type, ...] = (TimeoutError,)):
+    """
+    Re-raise a client timeout as DeadlineExceeded when ``timeout`` had been cut
+    below ``cap`` by the request budget: the request ran out of time, the
+    provider did not fail.
+    """
+    try:
+        yield
+    except timeout_errors as e:
+        if timeout < cap:
+            raise DeadlineExceeded(f"call did not finish within the remaining {timeout:.1f}s budget") from e
+        raise
+
+
+def mark_degraded(state: dict, reason: str):
+    """Record that a degraded path was taken, so the response can say so"""
+    reasons = state.get("degraded") or []
+    if reason not in reasons:
+        state["degraded"] = reasons + [reason]
+
+
+def call_with_deadline(state: Mapping[str, Any], fn: Callable, *args, **kwargs):
+    """
+    Run ``fn`` and give up at the state's deadline.
+    SDK clients that take no timeout run on a daemon thread which is abandoned
+    when the deadline passes; its result is discarded.
+    """
+    budget = remaining(state)
+    if budget == math.inf:
+        return fn(*args, **kwargs)
+    if budget <= 0:
+        raise DeadlineExceeded(f"no time left for {getattr(fn, '__name__', 'call')}")
+
+    outcome = {}
+
+    def target():
+        try:
+            outcome["value"] = fn(*args, **kwargs)
+        except BaseException as e:
+            outcome["error"] = e
+
+    worker = threading.Thread(target=target, daemon=True)
+    worker.start()
+    worker.join(budget)
+    if worker.is_alive():
+        raise DeadlineExceeded(f"{getattr(fn, '__name__', 'call')} did not finish within {budget:.1f}s")
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["value"]
@@ -1,4 +1,5 @@
 
+import os
 from langgraph.graph import StateGraph, END, START
 from src.state.Agentstate import AgentState
 from src.nodes.extract_symptoms_node import SymptomExtractorGemini
@@ -6,18 +7,23 @@ from src.nodes import refine_query_node
 from src.nodes.vector_search_node import DiseaseRAG
 from src.nodes.web_search_node import MedicalWebSearchAgent
 from src.nodes import generate_response_node 
+from src.nodes import budget_node
+from src.nodes.speculative_node import SpeculativeExecutor
+from src.graph.deadline import has_budget, new_deadline
 class decision:
     def decide_next_step(self, state: AgentState) -> str:
-        """Decide next step based on similarity score"""
+        """Decide next step based on similarity score and remaining time budget"""
         score = state["similarity_score"]
         retry_count = state["retry_count"]
         
         if score >= 0.7:
             return "generate_response"
-        elif retry_count < 3:
+        elif retry_count < 3 and has_budget(state, "refine_query", "vector_search", "generate_response"):
             return "refine_query"
-        else:
+        elif has_budget(state, "web_search", "generate_response"):
             return "web_search"
+        else:
+            return "budget_exhausted"
     
     def decide_after_web_search(self, state: AgentState) -> str:
         """Decide next step after web search"""
@@ -27,29 +33,44 @@ class decision:
         if score >= 0.7:
             return "generate_response"
         elif retry_count < 3:
-            return "refine_query"
+            if has_budget(state, "refine_query", "vector_search", "generate_response"):
+                return "refine_query"
+            return "budget_exhausted"
         else:
             return "generate_response"
     
     def check_medicine_request(self, state: AgentState) -> str:
         """Check if user requested medicine information"""
         if state.get("medicine_request", False):
-            return "search_medicines"
+            if has_budget(state, "search_medicines"):
+                return "search_medicines"
+            return "skip_medicines"
         return "end"
 
-def setup_graph(self):
-        """Create LangGraph workflow"""
+def setup_graph(self, speculative: bool = None):
+        """Create LangGraph workflow
+
+        With ``speculative`` (or GRAPH_SPECULATIVE=1) web search starts alongside the
+        first vector search when the knowledge base predicts a low score, and the
+        medicine search runs concurrently with response generation.
+        """
+        if speculative is None:
+            speculative = os.getenv("GRAPH_SPECULATIVE", "0") == "1"
         workflow = StateGraph(AgentState)
         obj=decision()
         obj1=SymptomExtractorGemini()
         dis=DiseaseRAG()
+        web=MedicalWebSearchAgent()
+        spec=SpeculativeExecutor(dis, web) if speculative else None
         # Add nodes
         workflow.add_node("extract_symptoms", obj1.extract_symptoms_node)
-        workflow.add_node("vector_search", dis.vector_search_node)
+        workflow.add_node("vector_search", spec.vector_search_node if spec else dis.vector_search_node)
         workflow.add_node("refine_query", refine_query_node.refine_query_node)
-        workflow.add_node("web_search", MedicalWebSearchAgent.search_disease)
-        workflow.add_node("generate_response", generate_response_node.generate_response_node)
-        workflow.add_node("search_medicines", MedicalWebSearchAgent.search_medicines)
+        workflow.add_node("web_search", spec.web_search_node if spec else web.search_disease)
+        workflow.add_node("generate_response", spec.respond_node if spec else generate_response_node.generate_response_node)
+        workflow.add_node("search_medicines", web.search_medicines)
+        workflow.add_node("budget_exhausted", budget_node.budget_exhausted_node)
+        workflow.add_node("skip_medicines", budget_node.skip_medicines_node)
         
         # Set entry point
         workflow.add_edge(START, "extract_symptoms")
@@ -62,26 +83,70 @@ def setup_graph(self):
             {
                 "refine_query": "refine_query",
                 "web_search": "web_search", 
-                "generate_response": "generate_response"
+                "generate_response": "generate_response",
+                "budget_exhausted": "budget_exhausted"
             }
         )
         workflow.add_edge("refine_query", "vector_search")
+        workflow.add_edge("budget_exhausted", "generate_response")
         workflow.add_conditional_edges(
             "web_search",
             obj.decide_after_web_search,
             {
                 "refine_query": "refine_query",
-                "generate_response": "generate_response"
-            }
-        )
-        workflow.add_conditional_edges(
-            "generate_response",
-            obj.check_medicine_request,
-            {
-                "search_medicines": "search_medicines",
-                "end": END
+                "generate_response": "generate_response",
+                "budget_exhausted": "budget_exhausted"
             }
         )
+        if spec:
+            # respond_node already ran (or skipped) the medicine search
+            workflow.add_edge("generate_response", END)
+        else:
+            workflow.add_conditional_edges(
+                "generate_response",
+                obj.check_medicine_request,
+                {
+                    "search_medicines": "search_medicines",
+                    "skip_medicines": "skip_medicines",
+                    "end": END
+                }
+            )
         workflow.add_edge("search_medicines", END)
+        workflow.add_edge("skip_medicines", END)
         
-        self.app = workflow.compile()
\ No newline at end of file
+        self.app = workflow.compile()
+        self.rag = dis
+
+
+class GraphHolder:
+    """Plain holder for setup_graph outside of Streamlit; exposes ``app`` and the shared ``rag``"""
+    def __init__(self):
+        self.app = None
+        self.rag = None
+        setup_graph(self)
+
+
+def build_graph():
+        """Compile the workflow outside of Streamlit (load tests, pre-fork server)"""
+        return GraphHolder().app
+
+
+def initial_state(user_query: str, medicine_request: bool = False, conversation_history=None) -> AgentState:
+        """Fresh AgentState for one request, with its own deadline"""
+        return {
+            "user_query": user_query,
+            "extracted_symptoms": [],
+            "similarity_score": 0.0,
+            "retrieved_disease": None,
+            "refined_query": "",
+            "retry_count": 0,
+            "final_response": "",
+            "medicine_request": medicine_request,
+            "medicines": [],
+            "medicine_snippet_id": None,
+            "conversation_history": conversation_history or [],
+            "messages": [],
+            "deadline": new_deadline(),
+            "degraded": [],
+            "speculation_id": ""
+        }
@@ -0,0 +1,164 @@
+import cProfile
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Opt-in profiling settings
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_MIN_INTERVAL = float(os.getenv("PROFILE_MIN_INTERVAL", "60"))
+PROFILE_MAX_DISK_MB = float(os.getenv("PROFILE_MAX_DISK_MB", "200"))
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "5"))
+PROFILE_SAMPLE_HZ = float(os.getenv("PROFILE_SAMPLE_HZ", "200"))
+PROFILE_TOP_ALLOCATIONS = 30
+PROFILE_TOP_STACKS = 30
+
+# Only one profile runs at a time. tracemalloc and the stack sampler are
+# process-wide, so while it runs every concurrent request pays some overhead
+# and appears in the output; PROFILE_MIN_INTERVAL bounds how often that happens.
+_slot = threading.Semaphore(1)
+_last_sampled = 0.0
+_sample_lock = threading.Lock()
+
+
+def should_profile(requested: bool = False) -> bool:
+    """
+    True when the request asked for a profile, or it is picked by the sampler.
+    Explicit requests are rate limited like sampled ones, since any client can ask.
+    """
+    global _last_sampled
+    if not requested and (PROFILE_SAMPLE_RATE <= 0 or random.random() >= PROFILE_SAMPLE_RATE):
+        return False
+    with _sample_lock:
+        now = time.monotonic()
+        if _last_sampled and now - _last_sampled < PROFILE_MIN_INTERVAL:
+            return False
+        _last_sampled = now
+        return True
+
+
+class _StackSampler(threading.Thread):
+    """
+    Wall-clock sampler of every thread's stack.
+    cProfile only sees the thread that enabled it; work handed to
+    call_with_deadline threads and the shard pool is only visible here.
+    """
+
+    def __init__(self, hz: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = 1.0 / hz
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._done = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        while not self._done.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+def _enforce_disk_cap(directory: str):
+    """Delete the oldest profile files until the directory fits in PROFILE_MAX_DISK_MB"""
+    files = [os.path.join(directory, f) for f in os.listdir(directory)]
+    files = sorted((f for f in files if os.path.isfile(f)), key=os.path.getmtime)
+    total = sum(os.path.getsize(f) for f in files)
+    limit = PROFILE_MAX_DISK_MB * 1024 * 1024
+    while files and total > limit:
+        oldest = files.pop(0)
+        total -= os.path.getsize(oldest)
+        os.remove(oldest)
+
+
+@contextmanager
+def profile_section(name: str, enabled: bool = False):
+    """
+    Capture a cProfile, an all-thread stack sample and a tracemalloc snapshot
+    around the wrapped block.
+
+    Writes ``<stamp>_<name>.prof`` (pstats of the calling thread; opens in
+    snakeviz, tuna, pstats), ``<stamp>_<name>.folded`` (sampled stacks of all
+    threads, rooted at the thread name; opens in speedscope or flamegraph.pl),
+    ``<stamp>_<name>.tracemalloc`` (tracemalloc.Snapshot.load) and a
+    ``<stamp>_<name>.txt`` summary of the hottest stacks and allocation sites.
+    Skipped silently if disabled or another profile is already running.
+    """
+    if not enabled or not _slot.acquire(blocking=False):
+        yield None
+        return
+
+    started_tracing = not tracemalloc.is_tracing()
+    try:
+        if started_tracing:
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+        before = tracemalloc.take_snapshot()
+        profiler = cProfile.Profile()
+        sampler = _StackSampler(PROFILE_SAMPLE_HZ)
+        start = time.perf_counter()
+        sampler.start()
+        profiler.enable()
+        try:
+            yield profiler
+        finally:
+            profiler.disable()
+            sampler.stop()
+            elapsed = time.perf_counter() - start
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            try:
+                _write_profile(name, profiler, sampler, before, after, elapsed, peak)
+            except OSError as e:
+                logger.warning(f"Could not write profile for {name}: {e}")
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        _slot.release()
+
+
+def _write_profile(name, profiler, sampler, before, after, elapsed, peak):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S") + f"-{int(time.time() * 1000) % 1000:03d}"
+    base = os.path.join(PROFILE_DIR, f"{stamp}_{name}")
+
+    profiler.dump_stats(base + ".prof")
+    after.dump(base + ".tracemalloc")
+    with open(base + ".folded", "w") as f:
+        for stack, count in sampler.stacks.items():
+            f.write(f"{stack} {count}\n")
+    with open(base + ".txt", "w") as f:
+        f.write(f"section: {name}\n")
+        f.write(f"wall time: {elapsed:.3f}s\n")
+        f.write(f"peak traced memory: {peak / 1024 / 1024:.1f} MB\n\n")
+        f.write(f"hottest sampled stacks ({sampler.samples} samples, all threads):\n")
+        for stack, count in sampler.stacks.most_common(PROFILE_TOP_STACKS):
+            thread, _, frames = stack.partition(";")
+            f.write(f"{count:6d}  [{thread}] {frames.rsplit(';', 1)[-1]}\n")
+        f.write("\n")
+        f.write("top allocation growth:\n")
+        for stat in after.compare_to(before, "lineno")[:PROFILE_TOP_ALLOCATIONS]:
+            f.write(f"{stat}\n")
+
+    _enforce_disk_cap(PROFILE_DIR)
+    logger.info(f"Profile for {name} written to {base}.prof ({elapsed:.2f}s)")
@@ -0,0 +1,279 @@
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import socket
+import threading
+import time
+import tracemalloc
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+
+from src.loadtest.stubs import DEFAULT_PROFILES, serve_forever, stub_environment
+from src.tools.metrics import metrics
+from src.state.records import state_footprint
+
+logger = logging.getLogger(__name__)
+
+MEDICINE_SUFFIXES = ["what medicine should I take?", "which medication helps?", "any drug for this?"]
+# Share of queries by kind. The rest are symptom lists straight from the dataset, which
+# mostly take the knowledge base's exact-match fast path and skip the LLM entirely
+DEFAULT_QUERY_MIX = {"narrative": 0.4, "perturbed": 0.3}
+
+
+class ResourceSampler:
+    """Samples process CPU utilisation and RSS on a background thread"""
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self.samples: List[Dict[str, float]] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="resource-sampler")
+
+    @staticmethod
+    def _rss_mb() -> float:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+        except (OSError, ValueError):
+            # ru_maxrss is a high-water mark (KB on Linux), good enough off-Linux
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    def _run(self):
+        start = last_wall = time.perf_counter()
+        last_cpu = sum(os.times()[:2])
+        while not self._stop.wait(self.interval):
+            wall, cpu = time.perf_counter(), sum(os.times()[:2])
+            self.samples.append({
+                "t": round(wall - start, 2),
+                "cpu_percent": round(100 * (cpu - last_cpu) / (wall - last_wall), 1),
+                "rss_mb": round(self._rss_mb(), 1),
+            })
+            last_wall, last_cpu = wall, cpu
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self) -> List[Dict[str, float]]:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+
+def load_queries(path: str = "datasets/final_diseasevssymptoms.csv",
+                 narratives_path: str = "datasets/diseassVssymptoms1.csv") -> Dict[str, list]:
+    """Symptom lists, their vocabulary and free-text narratives to build synthetic user queries from"""
+    with open(path, newline="") as f:
+        rows = [r["symptoms"] for r in csv.DictReader(f) if r.get("symptoms")]
+    symptom_lists = [[s.strip().replace("_", " ") for s in row.split(",") if s.strip()] for row in rows]
+    with open(narratives_path, newline="") as f:
+        narratives = [r["text"].strip() for r in csv.DictReader(f) if r.get("text")]
+    return {
+        "symptom_lists": symptom_lists,
+        "vocab": sorted({s for symptoms in symptom_lists for s in symptoms}),
+        "narratives": narratives,
+    }
+
+
+def make_query(queries: Dict[str, list], medicine_rate: float, rng: random.Random, mix: Dict[str, float] = None):
+    """(text, medicine_request, kind) for one simulated user turn"""
+    mix = DEFAULT_QUERY_MIX if mix is None else mix
+    roll = rng.random()
+    if roll < mix.get("narrative", 0.0) and queries["narratives"]:
+        kind = "narrative"
+        text = rng.choice(queries["narratives"]).rstrip(".")
+    else:
+        kind = "perturbed" if roll < mix.get("narrative", 0.0) + mix.get("perturbed", 0.0) else "symptom_list"
+        symptoms = rng.choice(queries["symptom_lists"])
+        picked = rng.sample(symptoms, min(len(symptoms), rng.randint(2, 4)))
+        if kind == "perturbed":
+            # A symptom from anywhere in the vocabulary: the set rarely points at one disease exactly
+            picked[rng.randrange(len(picked))] = rng.choice(queries["vocab"])
+        text = "I have " + ", ".join(picked[:-1]) + (" and " if len(picked) > 1 else "") + picked[-1]
+    medicine = rng.random() < medicine_rate
+    if medicine:
+        text += ", " + rng.choice(MEDICINE_SUFFIXES)
+    return text, medicine, kind
+
+
+def _session(graph, deadline: float, queries, medicine_rate: float, mix, seed: int, records: list, lock):
+    from src.graph.graph_builder import initial_state
+
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        query, medicine, kind = make_query(queries, medicine_rate, rng, mix)
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        record = {"medicine_request": medicine, "kind": kind}
+        try:
+            result = graph.invoke(initial_state(query, medicine))
+            if tracemalloc.is_tracing():
+                record["alloc_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            record.update(
+                ok=True,
+                retried=result.get("retry_count", 0) > 0,
+                fast_path=getattr(result.get("retrieved_disease"), "source", "") == "knowledge_base",
+                web_search=getattr(result.get("retrieved_disease"), "source", "") == "web",
+                state_bytes=state_footprint(result),
+                degraded=bool(result.get("degraded")),
+            )
+        except Exception as e:
+            record.update(ok=False, error=type(e).__name__)
+        record["latency_s"] = time.perf_counter() - start
+        with lock:
+            records.append(record)
+
+
+def run_level(graph, concurrency: int, duration: float, queries, medicine_rate: float,
+              mix: Dict[str, float] = None, seed: int = 0) -> dict:
+    """Drive ``concurrency`` simulated sessions through the graph for ``duration`` seconds"""
+    records, lock = [], threading.Lock()
+    sampler = ResourceSampler().start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="session") as pool:
+        for i in range(concurrency):
+            pool.submit(_session, graph, start + duration, queries, medicine_rate, mix, seed + i, records, lock)
+    elapsed = time.perf_counter() - start
+    resources = sampler.stop()
+
+    latencies = np.array([r["latency_s"] for r in records if r["ok"]]) if records else np.zeros(0)
+    ok = [r for r in records if r["ok"]]
+
+    def share(key):
+        return round(sum(1 for r in ok if r.get(key)) / len(ok), 3) if ok else 0.0
+
+    def pct(q):
+        return round(float(np.percentile(latencies, q)), 3) if len(latencies) else None
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(records),
+        "errors": len(records) - len(ok),
+        "error_rate": round((len(records) - len(ok)) / len(records), 3) if records else 0.0,
+        "throughput_rps": round(len(ok) / elapsed, 3),
+        "latency_s": {"p50": pct(50), "p90": pct(90), "p99": pct(99), "max": pct(100)},
+        "query_mix": {
+            kind: round(sum(1 for r in records if r["kind"] == kind) / len(records), 3) if records else 0.0
+            for kind in ("symptom_list", "perturbed", "narrative")
+        },
+        "branches": {
+            "fast_path": share("fast_path"),
+            "retried": share("retried"),
+            "web_search": share("web_search"),
+            "medicine": share("medicine_request"),
+            "degraded": share("degraded"),
+        },
+        "state_bytes": {
+            "mean": round(float(np.mean([r["state_bytes"] for r in ok])), 1) if ok else None,
+            "max": max((r["state_bytes"] for r in ok), default=None),
+        },
+        "alloc_peak_bytes_mean": (
+            round(float(np.mean([r["alloc_peak_bytes"] for r in ok if "alloc_peak_bytes" in r])), 1)
+            if any("alloc_peak_bytes" in r for r in ok) else None
+        ),
+        "cpu_percent_mean": round(float(np.mean([s["cpu_percent"] for s in resources])), 1) if resources else None,
+        "rss_mb_max": max((s["rss_mb"] for s in resources), default=None),
+        "resources": resources,
+    }
+
+
+def find_saturation(levels: List[dict], slo_p99: float, min_gain: float = 0.1, max_error_rate: float = 0.05):
+    """First concurrency where throughput stops scaling, errors spike, or p99 breaks the SLO"""
+    for prev, cur in zip([None] + levels[:-1], levels):
+        p99 = cur["latency_s"]["p99"]
+        if cur["error_rate"] > max_error_rate or (p99 is not None and p99 > slo_p99):
+            return cur["concurrency"]
+        if prev and cur["throughput_rps"] < prev["throughput_rps"] * (1 + min_gain):
+            return cur["concurrency"]
+    return None
+
+
+def _wait_for_port(port: int, timeout: float = 10.0):
+    end = time.time() + timeout
+    while time.time() < end:
+        with socket.socket() as s:
+            if s.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f"Stub server did not start on port {port}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the diagnosis graph against local API stubs")
+    parser.add_argument("--levels", default="1,2,4,8,16", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per level")
+    parser.add_argument("--medicine-rate", type=float, default=0.3, help="share of queries asking for medicines")
+    parser.add_argument("--narrative-rate", type=float, default=DEFAULT_QUERY_MIX["narrative"],
+                        help="share of queries taken verbatim from the free-text narratives")
+    parser.add_argument("--perturb-rate", type=float, default=DEFAULT_QUERY_MIX["perturbed"],
+                        help="share of symptom-list queries with one symptom swapped for a random one")
+    parser.add_argument("--dont-know-rate", type=float, default=None, help="share of Groq answers that force a retry")
+    parser.add_argument("--profiles", help="JSON file overriding stub latency/error profiles")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--slo-p99", type=float, default=20.0, help="p99 latency SLO in seconds")
+    parser.add_argument("--output", default="loadtest_report.json")
+    parser.add_argument("--trace-alloc", action="store_true",
+                        help="record per-request peak allocations (meaningful with --levels 1)")
+    args = parser.parse_args()
+    if args.trace_alloc:
+        tracemalloc.start()
+
+    profiles = {name: dict(cfg) for name, cfg in DEFAULT_PROFILES.items()}
+    if args.profiles:
+        with open(args.profiles) as f:
+            for name, cfg in json.load(f).items():
+                profiles.setdefault(name, {}).update(cfg)
+    if args.dont_know_rate is not None:
+        profiles["groq"]["dont_know_rate"] = args.dont_know_rate
+
+    # Stubs run in their own process so they don't compete with the graph for the GIL
+    stub = multiprocessing.Process(target=serve_forever, args=(args.port, profiles), daemon=True)
+    stub.start()
+    try:
+        _wait_for_port(args.port)
+        os.environ.update(stub_environment(args.port))
+        # Imported late: node modules read their endpoints from the environment
+        from src.graph.graph_builder import build_graph
+
+        graph = build_graph()
+        queries = load_queries()
+        mix = {"narrative": args.narrative_rate, "perturbed": args.perturb_rate}
+
+        levels = []
+        for concurrency in (int(c) for c in args.levels.split(",")):
+            logger.info(f"Running {concurrency} concurrent sessions for {args.duration:.0f}s")
+            level = run_level(graph, concurrency, args.duration, queries, args.medicine_rate, mix)
+            levels.append(level)
+            print(
+                f"c={concurrency:>3}  rps={level['throughput_rps']:>7.2f}  "
+                f"p50={level['latency_s']['p50']}s  p99={level['latency_s']['p99']}s  "
+                f"err={level['error_rate']:.1%}  cpu={level['cpu_percent_mean']}%  rss={level['rss_mb_max']}MB  "
+                f"branches={level['branches']}"
+            )
+
+        report = {
+            "profiles": profiles,
+            "levels": levels,
+            "saturation_concurrency": find_saturation(levels, args.slo_p99),
+            "stub_calls": json.load(urllib.request.urlopen(f"http://127.0.0.1:{args.port}/_stats")),
+            "app_metrics": metrics.snapshot(),
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saturation point: {report['saturation_concurrency']}  (report written to {args.output})")
+    finally:
+        stub.terminate()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,185 @@
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Local stand-ins for Gemini, Groq, the refine-query LLM, Serper and SerpAPI.
+# Per-service latency (lognormal around median_ms) and failure behaviour
+DEFAULT_PROFILES = {
+    "gemini": {"median_ms": 400, "sigma": 0.5, "error_rate": 0.01, "throttle_rate": 0.01},
+    "groq": {"median_ms": 300, "sigma": 0.5, "error_rate": 0.01, "throttle_rate": 0.01, "dont_know_rate": 0.3},
+    "refine": {"median_ms": 350, "sigma": 0.5, "error_rate": 0.02, "throttle_rate": 0.0},
+    "serper": {"median_ms": 600, "sigma": 0.6, "error_rate": 0.05, "throttle_rate": 0.03},
+    "serpapi": {"median_ms": 800, "sigma": 0.6, "error_rate": 0.05, "throttle_rate": 0.03},
+}
+
+_SNIPPETS = [
+    ("Influenza - Symptoms and causes", "Influenza is a viral infection. Doctors often prescribe oseltamivir and acetaminophen to ease fever and body aches."),
+    ("Common cold treatment", "The common cold is usually treated with rest. Taking ibuprofen or pseudoephedrine can relieve symptoms."),
+    ("Gastroenteritis overview", "Gastroenteritis is an infection of the gut. Treatment with omeprazole or famotidine may help stomach pain."),
+    ("Allergic rhinitis", "Allergy symptoms of sneezing and itching are treated with cetirizine, loratadine or fexofenadine."),
+    ("Migraine", "A migraine is a disorder causing headache. Patients often take naproxen or aspirin at onset."),
+]
+
+
+def _openai_completion(content: str, model: str = "stub") -> dict:
+    return {
+        "id": "stub-completion",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    }
+
+
+def _prompt_of(body: dict) -> str:
+    messages = body.get("messages") or [{}]
+    return str(messages[-1].get("content", ""))
+
+
+def _gemini_reply(body: dict, profile: dict) -> dict:
+    prompt = " ".join(p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", []))
+    match = re.search(r'User: "(.*)"', prompt)
+    query = match.group(1) if match else prompt
+    query = re.sub(r"^(i have|i've got|i am having)\s+", "", query.strip(), flags=re.I)
+    query = re.sub(r"\b(what )?(medicine|medication|drug|treatment|pill)s?\b.*$", "", query, flags=re.I)
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": query.strip(" ,.")}]}, "finishReason": "STOP", "index": 0}],
+        "usageMetadata": {"promptTokenCount": 1, "candidatesTokenCount": 1, "totalTokenCount": 2},
+    }
+
+
+def _groq_reply(body: dict, profile: dict) -> dict:
+    if random.random() < profile.get("dont_know_rate", 0.0):
+        return _openai_completion("I don't know", body.get("model", "stub"))
+    match = re.search(r"CONTEXT:\s*(.+?):", _prompt_of(body), flags=re.S)
+    return _openai_completion(match.group(1).strip() if match else "I don't know", body.get("model", "stub"))
+
+
+def _refine_reply(body: dict, profile: dict) -> dict:
+    match = re.search(r'Original Text: "(.*)"', _prompt_of(body), flags=re.S)
+    return _openai_completion(f"Could these be signs of something: {match.group(1) if match else ''}")
+
+
+def _organic(n: int, title_key: str = "title", snippet_key: str = "snippet") -> list:
+    return [{title_key: t, snippet_key: s} for t, s in random.sample(_SNIPPETS, min(n, len(_SNIPPETS)))]
+
+
+class StubState:
+    """Shared profile table and request counters for one stub server"""
+
+    def __init__(self, profiles: Dict[str, dict] = None):
+        self.profiles = {name: dict(cfg) for name, cfg in (profiles or DEFAULT_PROFILES).items()}
+        self.counts: Dict[str, Dict[str, int]] = {name: {"ok": 0, "error": 0, "throttled": 0} for name in self.profiles}
+        self.lock = threading.Lock()
+
+    def count(self, service: str, outcome: str):
+        with self.lock:
+            self.counts[service][outcome] += 1
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    state: StubState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _route(self):
+        path = urlparse(self.path).path
+        if path.startswith("/gemini") and "generateContent" in path:
+            return "gemini", _gemini_reply
+        if path.startswith("/groq") and path.endswith("chat/completions"):
+            return "groq", _groq_reply
+        if path.startswith("/refine"):
+            return "refine", _refine_reply
+        if path.startswith("/serper"):
+            return "serper", lambda body, profile: {"organic": _organic(int(body.get("num", 5)))}
+        if path.startswith("/serpapi"):
+            return "serpapi", lambda body, profile: {"organic_results": _organic(5)}
+        return None, None
+
+    def _respond(self, status: int, payload: dict, headers: Dict[str, str] = None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self):
+        if urlparse(self.path).path == "/_stats":
+            with self.state.lock:
+                self._respond(200, self.state.counts)
+            return
+        service, reply = self._route()
+        if service is None:
+            self._respond(404, {"error": f"no stub for {self.path}"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            body = {}
+
+        profile = self.state.profiles[service]
+        time.sleep(random.lognormvariate(math.log(profile["median_ms"] / 1000.0), profile["sigma"]))
+
+        roll = random.random()
+        if roll < profile.get("throttle_rate", 0.0):
+            self.state.count(service, "throttled")
+            self._respond(429, {"error": {"message": "rate limited", "code": 429}}, {"Retry-After": "1"})
+        elif roll < profile.get("throttle_rate", 0.0) + profile.get("error_rate", 0.0):
+            self.state.count(service, "error")
+            self._respond(500, {"error": {"message": "stub failure", "code": 500}})
+        else:
+            self.state.count(service, "ok")
+            self._respond(200, reply(body, profile))
+
+    do_GET = _handle
+    do_POST = _handle
+
+
+def serve(port: int = 0, profiles: Dict[str, dict] = None):
+    """Start the stub server on a daemon thread; returns (server, StubState)"""
+    state = StubState(profiles)
+    handler = type("BoundStubHandler", (StubHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="stub-server").start()
+    logger.info(f"Stub services listening on 127.0.0.1:{server.server_address[1]}")
+    return server, state
+
+
+def serve_forever(port: int, profiles: Dict[str, dict] = None):
+    """Process entry point: run the stub server until the process is terminated"""
+    server, _ = serve(port, profiles)
+    while True:
+        time.sleep(3600)
+
+
+def stub_environment(port: int) -> Dict[str, str]:
+    """Environment variables that point every client in the graph at the stub server"""
+    base = f"http://127.0.0.1:{port}"
+    return {
+        "GEMINI_BASE_URL": f"{base}/gemini",
+        "GOOGLE_API_KEY": "stub",
+        "GROQ_BASE_URL": f"{base}/groq",
+        "GROQ_API_KEY": "stub",
+        "REFINE_LLM_URL": f"{base}/refine/v1/chat/completions",
+        "REFINE_LLM_MODEL": "stub",
+        "SERPER_URL": f"{base}/serper/search",
+        "serper_api_key": "stub",
+        "SERPAPI_URL": f"{base}/serpapi/search",
+        "DUCKDUCKGO_ENABLED": "0",
+    }
@@ -0,0 +1,17 @@
+from src.state.Agentstate import AgentState
+from src.graph.deadline import mark_degraded
+
+
+def budget_exhausted_node(state: AgentState) -> AgentState:
+        """Answer with the best candidate so far when refinement/web search no longer fit the deadline"""
+        mark_degraded(state, "query refinement and web search skipped (time budget)")
+        return state
+
+
+def skip_medicines_node(state: AgentState) -> AgentState:
+        """Close the request without a medicine search when it would overrun the deadline"""
+        mark_degraded(state, "medicine search skipped (time budget)")
+        state["final_response"] = state.get("final_response", "") + (
+            "\n\n**Medicine Search:** Skipped to stay within the response time limit. Please ask again for medicine information."
+        )
+        return state
@@ -1,5 +1,8 @@
+import os
 from google import genai
 from src.state.Agentstate import AgentState
+from src.graph.deadline import DeadlineExceeded, mark_degraded
+from src.tools.rate_limit import ProviderUnavailable, call_limited
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -7,7 +10,12 @@ load_dotenv()
 class SymptomExtractorGemini:
     def __init__(self):
         
-        self.client = genai.Client(api_key=None)
+        # GEMINI_BASE_URL points the client at a different endpoint (e.g. a local stub)
+        base_url = os.getenv("GEMINI_BASE_URL")
+        self.client = genai.Client(
+            api_key=None,
+            http_options={"base_url": base_url} if base_url else None
+        )
         
     def extract_symptoms_node(self, state: AgentState) -> dict:
         query = state["user_query"].strip()
@@ -18,11 +26,26 @@ class SymptomExtractorGemini:
             "Symptoms:"
         )
 
-        response = self.client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt
-        )
-        text = response.text.strip()
+        try:
+            response = call_limited(
+                "gemini",
+                state,
+                self.client.models.generate_content,
+                model="gemini-2.5-flash",
+                contents=prompt
+            )
+            text = response.text.strip()
+        except DeadlineExceeded:
+            # Out of time: treat the raw query as the symptom list
+            mark_degraded(state, "symptom extraction skipped (time budget)")
+            text = query
+        except ProviderUnavailable:
+            mark_degraded(state, "symptom extraction skipped (provider unavailable)")
+            text = query
+        except Exception:
+            # 429/5xx and other Gemini errors; the limiter has already recorded them
+            mark_degraded(state, "symptom extraction skipped (provider error)")
+            text = query
 
         parts = text.split("Symptoms:")
         symptom_part = parts[-1].strip().rstrip(".")
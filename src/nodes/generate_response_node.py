@@ -1,9 +1,24 @@
 from src.state.Agentstate import AgentState
+from src.state.records import DiseaseRecord
+
+
+def degraded_notice(state: AgentState) -> str:
+        """Closing note listing the steps shortened to meet the deadline, or "" """
+        degraded = state.get("degraded") or []
+        if not degraded:
+            return ""
+        return (
+            "\n**Reduced Answer:** To respond in time, some steps were shortened ("
+            + "; ".join(degraded)
+            + "). This result may be less accurate than usual.\n"
+        )
 
 
 def generate_response_node(state: AgentState) -> AgentState:
         """Generate user-friendly response"""
-        disease = state["retrieved_disease"]
+        # Full metadata is looked up only now, from the shared knowledge base
+        record = state.get("retrieved_disease")
+        disease = record.resolve() if record is not None else DiseaseRecord("Unknown", source="none").resolve()
         symptoms = state["extracted_symptoms"]
         
         response = f"""
@@ -22,5 +37,5 @@ Based on your symptoms ({', '.join(symptoms)}), here's what I found:
 Would you like me to search for common medications used for this condition?
 """
         
-        state["final_response"] = response
+        state["final_response"] = response + degraded_notice(state)
         return state
\ No newline at end of file
@@ -1,17 +1,20 @@
 import os
 import requests
 from src.state.Agentstate import AgentState
+from src.graph.deadline import budget_timeout, remaining, timeout_for
+from src.tools.rate_limit import get_limiter
 
-GEMINI_URL = ""
-GEMINI_MODEL = ""
+GEMINI_URL = os.getenv("REFINE_LLM_URL", "")
+GEMINI_MODEL = os.getenv("REFINE_LLM_MODEL", "")
 
-def call_gemini(prompt: str) -> str:
+def call_gemini(prompt: str, timeout: float = 10) -> str:
     api_key = os.getenv("")
     
     resp = requests.post(
         GEMINI_URL,
         
-        json={"model": GEMINI_MODEL, "messages": [{"role": "user", "content": prompt}]}
+        json={"model": GEMINI_MODEL, "messages": [{"role": "user", "content": prompt}]},
+        timeout=timeout
     )
     resp.raise_for_status()
     return resp.json().get("choices", [{}])[0].get("message", {}).get("content", "").strip()
@@ -38,7 +41,11 @@ def refine_query_node(state: AgentState) -> AgentState:
 )
 
     try:
-        refined = call_gemini(prompt)
+        # Computed up front: a spent budget must not count as a provider failure
+        timeout = timeout_for(state, 10)
+        with get_limiter("refine").slot(timeout=remaining(state)):
+            with budget_timeout(timeout, 10, (requests.Timeout,)):
+                refined = call_gemini(prompt, timeout=timeout)
         if not refined:
             raise ValueError("Empty response from Gemini")
     except Exception:
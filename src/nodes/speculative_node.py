@@ -0,0 +1,157 @@
+import logging
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, Optional, Tuple
+
+from src.state.Agentstate import AgentState
+from src.graph.deadline import has_budget, mark_degraded, remaining
+from src.nodes import budget_node
+from src.nodes import generate_response_node
+from src.tools.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Speculative results nobody claimed are dropped after this many seconds
+SPECULATION_TTL = 120.0
+
+
+def _wait_timeout(state: AgentState) -> Optional[float]:
+    left = remaining(state)
+    return None if math.isinf(left) else max(0.0, left)
+
+
+class SpeculativeExecutor:
+    """
+    Node wrappers that run graph branches ahead of time.
+
+    - vector_search: when the knowledge base predicts a low score, web search
+      starts in the background; web_search later joins it instead of searching
+      again. If the vector search succeeds, the speculative search is dropped.
+    - generate_response: when medicines were requested, the medicine search
+      runs concurrently and its updates are applied after the response, which
+      gives the same state as the sequential graph.
+
+    Medicine searches have their own pool, so speculation can never delay a
+    search the user asked for; speculation is skipped while its pool is busy.
+    """
+
+    def __init__(self, rag, web, max_workers: int = 8, medicine_workers: int = 4):
+        self.rag = rag
+        self.web = web
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculative")
+        self._medicine_pool = ThreadPoolExecutor(max_workers=medicine_workers, thread_name_prefix="medicines")
+        self._pending: Dict[str, Tuple[Future, float, threading.Event]] = {}
+        self._running = 0
+        self._lock = threading.Lock()
+
+    def _saturated(self) -> bool:
+        """True when a new speculative search would queue behind running ones"""
+        with self._lock:
+            return self._running >= self.max_workers
+
+    def _finished(self, future: Future):
+        with self._lock:
+            self._running -= 1
+
+    def _start(self, state: AgentState) -> str:
+        speculation_id = uuid.uuid4().hex
+        cancel = threading.Event()
+        # search_disease mutates its input, so it gets its own copy of the state
+        with self._lock:
+            self._running += 1
+        future = self._pool.submit(self.web.search_disease, dict(state), cancel)
+        future.add_done_callback(self._finished)
+        with self._lock:
+            self._expire()
+            self._pending[speculation_id] = (future, time.monotonic(), cancel)
+        metrics.inc("speculation_total", branch="web_search", outcome="started")
+        return speculation_id
+
+    def _take(self, state: AgentState) -> Optional[Tuple[Future, float, threading.Event]]:
+        with self._lock:
+            return self._pending.pop(state.get("speculation_id") or "", None)
+
+    @staticmethod
+    def _cancel(entry: Tuple[Future, float, threading.Event]):
+        future, _, cancel = entry
+        # Future.cancel() only helps while queued; the event stops a search already running
+        cancel.set()
+        future.cancel()
+
+    def _discard(self, state: AgentState):
+        entry = self._take(state)
+        if entry is not None:
+            self._cancel(entry)
+            metrics.inc("speculation_total", branch="web_search", outcome="wasted")
+
+    def _expire(self):
+        cutoff = time.monotonic() - SPECULATION_TTL
+        for speculation_id, entry in list(self._pending.items()):
+            if entry[1] < cutoff:
+                self._cancel(entry)
+                del self._pending[speculation_id]
+
+    def vector_search_node(self, state: AgentState) -> AgentState:
+        symptoms = state.get("extracted_symptoms", [])
+        if (state.get("retry_count", 0) == 0 and not state.get("speculation_id")
+                and has_budget(state, "web_search") and self.rag.predict_low_score(symptoms)):
+            if self._saturated():
+                metrics.inc("speculation_total", branch="web_search", outcome="skipped")
+            else:
+                state["speculation_id"] = self._start(state)
+
+        state = self.rag.vector_search_node(state)
+        if state["similarity_score"] >= 0.7:
+            self._discard(state)
+        return state
+
+    def web_search_node(self, state: AgentState) -> AgentState:
+        entry = self._take(state)
+        if entry is None:
+            return self.web.search_disease(state)
+        future = entry[0]
+        try:
+            result = future.result(timeout=_wait_timeout(state))
+        except FutureTimeout:
+            self._cancel(entry)
+            mark_degraded(state, "web search cut short (time budget)")
+            return state
+        except Exception as e:
+            logger.warning(f"Speculative web search failed, searching again: {e}")
+            return self.web.search_disease(state)
+
+        metrics.inc("speculation_total", branch="web_search", outcome="used")
+        state["retrieved_disease"] = result["retrieved_disease"]
+        for reason in result.get("degraded") or []:
+            mark_degraded(state, reason)
+        return state
+
+    def respond_node(self, state: AgentState) -> AgentState:
+        # Any web search still in flight is no longer needed
+        self._discard(state)
+        if not state.get("medicine_request", False):
+            return generate_response_node.generate_response_node(state)
+        if not has_budget(state, "search_medicines"):
+            return budget_node.skip_medicines_node(generate_response_node.generate_response_node(state))
+
+        medicines = self._medicine_pool.submit(self.web.search_medicines, dict(state))
+        metrics.inc("speculation_total", branch="search_medicines", outcome="started")
+        state = generate_response_node.generate_response_node(state)
+        try:
+            result = medicines.result(timeout=_wait_timeout(state))
+        except FutureTimeout:
+            medicines.cancel()
+            return budget_node.skip_medicines_node(state)
+
+        # Same updates, in the same order, as search_medicines after generate_response
+        for key in ("medicines", "medicine_snippet_id", "final_response"):
+            if key in result:
+                state[key] = result[key]
+        for reason in result.get("degraded") or []:
+            mark_degraded(state, reason)
+        metrics.inc("speculation_total", branch="search_medicines", outcome="used")
+        return state
@@ -1,14 +1,23 @@
 import os
-import pandas as pd
 import numpy as np
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 from langchain_huggingface.embeddings import HuggingFaceEmbeddings
-from langchain.vectorstores import FAISS
-from langchain.chains import RetrievalQA
 from langchain_groq import ChatGroq
 from langchain_core.prompts import PromptTemplate
 from langchain_core.documents import Document
 from src.state.Agentstate import AgentState
+from src.state.records import DiseaseRecord, attach_knowledge_base
+from src.vector.ingest import DEFAULT_SOURCES, CanonicalDataset, build_or_load_canonical
+from src.vector.knowledge_base import DiseaseKnowledgeBase
+from src.vector.federated import DEFAULT_SHARDS, FederatedIndex
+from src.graph.deadline import DeadlineExceeded, mark_degraded, remaining
+from src.graph.profiling import profile_section
+from src.tools.rate_limit import ProviderUnavailable, call_limited
+from src.tools.metrics import metrics
+
+# Best knowledge-base Jaccard below which a query is predicted to need web search
+LOW_SCORE_JACCARD = 0.1
+
 
 class DiseaseRAG:
     def __init__(
@@ -16,40 +25,81 @@ class DiseaseRAG:
         csv_path: str = "Dataset_cleaned.csv",
         vector_db_path: str = "disease_db",
         groq_model: str = "Gemma2-9b-It",
+        kb_path: str = "disease_kb.bin",
+        canonical_path: str = "disease_canonical.npz",
+        shards: Optional[Dict[str, dict]] = None,
+        fusion: str = "rrf",
+        precision: Optional[str] = None,
     ):
         self.csv_path = csv_path
         self.vector_db_path = vector_db_path
+        self.canonical_path = canonical_path
+        self.fusion = fusion
+        # Source/shard "conditions" is the primary index; csv_path/vector_db_path override it
+        self.sources = {name: dict(cfg) for name, cfg in DEFAULT_SOURCES.items()}
+        self.sources["conditions"]["path"] = csv_path
+        self.shard_config = {name: dict(cfg) for name, cfg in (shards or DEFAULT_SHARDS).items()}
+        if "conditions" in self.shard_config:
+            self.shard_config["conditions"]["vector_db_path"] = vector_db_path
+        self._dataset = None
 
-        # 1️⃣ Initialize & store embeddings (same model for retrieval + scoring)
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-mpnet-base-v2",
-            model_kwargs={"device": "cpu", "trust_remote_code": True},
-        )
+        # PROFILE_STARTUP=1 captures model and index loading
+        with profile_section("model_load", enabled=os.getenv("PROFILE_STARTUP") == "1"):
+            self.kb = DiseaseKnowledgeBase.build_or_load(kb_path, canonical_path, self.sources)
+            attach_knowledge_base(self.kb)
 
-        self._build_or_load_db()
+            # 1️⃣ Initialize & store embeddings (same model for retrieval + scoring)
+            self.embeddings = HuggingFaceEmbeddings(
+                model_name="sentence-transformers/all-mpnet-base-v2",
+                model_kwargs={"device": "cpu", "trust_remote_code": True},
+            )
+            self._apply_precision(precision or os.getenv("EMBEDDING_PRECISION", "fp32"))
+
+            self._build_or_load_db()
         self._initialize_qa(groq_model)
+        metrics.register_collector("shards", self.shard_stats)
 
-    def _build_or_load_db(self):
-        df = pd.read_csv(self.csv_path, dtype=str)
-        texts = [f"{r['disease']}: {r['symptoms']}" for _, r in df.iterrows()]
-        metadata = df.to_dict(orient="records")
+    def _embedding_model(self):
+        # langchain_huggingface keeps the SentenceTransformer in ``_client``; older versions in ``client``
+        return getattr(self.embeddings, "_client", None) or getattr(self.embeddings, "client", None)
 
-        if not os.path.exists(self.vector_db_path):
-            self.db = FAISS.from_texts(texts, self.embeddings, metadatas=metadata)
-            self.db.save_local(self.vector_db_path)
-        else:
-            self.db = FAISS.load_local(
-                self.vector_db_path,
-                self.embeddings,
-                allow_dangerous_deserialization=True
-            )
+    def _apply_precision(self, precision: str):
+        """Optionally run the embedding model in reduced precision (int8 dynamic quantization)"""
+        if precision == "fp32":
+            return
+        if precision != "int8":
+            raise ValueError(f"Unsupported embedding precision: {precision}")
+        import torch
+
+        torch.quantization.quantize_dynamic(
+            self._embedding_model(), {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+
+    def freeze(self):
+        """Put the embedding model in inference-only mode so its weights are never written again"""
+        model = self._embedding_model()
+        model.eval()
+        for param in model.parameters():
+            param.requires_grad_(False)
 
-        self.retriever = self.db.as_retriever(search_type="similarity", search_kwargs={"k": 1})
+    def dataset(self) -> CanonicalDataset:
+        """Canonical ingested dataset, read or built on first use"""
+        if self._dataset is None:
+            self._dataset = build_or_load_canonical(self.canonical_path, self.sources)
+        return self._dataset
+
+    def _build_or_load_db(self):
+        self.index = FederatedIndex(self.embeddings, shards=self.shard_config, fusion=self.fusion, dataset=self.dataset)
+        primary = self.index.shards.get("conditions") or next(iter(self.index.shards.values()))
+        self.db = primary.db
 
     def _initialize_qa(self, model_name: str):
         llm = ChatGroq(
             model=model_name,
             groq_api_key=os.getenv("GROQ_API_KEY", ""),
+            base_url=os.getenv("GROQ_BASE_URL") or None,
+            # Retries and Retry-After are handled by the rate limiter and its circuit breaker
+            max_retries=0,
             temperature=0.2
         )
         prompt = PromptTemplate(
@@ -67,13 +117,21 @@ class DiseaseRAG:
     "Answer:"
             )
         )
-        self.qa = RetrievalQA.from_chain_type(
-            llm=llm,
-            chain_type="stuff",
-            retriever=self.retriever,
-            return_source_documents=True,
-            chain_type_kwargs={"prompt": prompt}
-        )
+        # The context is the fused federated hits, so the LLM sees every shard's candidates
+        self.qa = prompt | llm
+
+    def predict_low_score(self, symptoms: List[str]) -> bool:
+        """Cheap early signal (knowledge base only, no LLM or embedding) that vector search will score low"""
+        if self.kb.exact_match(symptoms) is not None:
+            return False
+        _, known, n_query = self.kb.encode(symptoms)
+        if n_query == 0 or len(known) / n_query < 0.5:
+            return True
+        return float(self.kb.jaccard(symptoms).max(initial=0.0)) < LOW_SCORE_JACCARD
+
+    def shard_stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-shard weight, query count and latency percentiles"""
+        return self.index.stats()
 
     @staticmethod
     def _cosine_sim(a: np.ndarray, b: np.ndarray) -> float:
@@ -84,38 +142,74 @@ class DiseaseRAG:
         symptoms: List[str] = state.get("extracted_symptoms", [])
         query_text = ", ".join(symptoms)
 
-        docs_and_scores = self.db.similarity_search_with_score(query_text, k=5)
-        if not docs_and_scores:
+        # Fast path: the symptom set points at exactly one disease, no LLM needed
+        match = self.kb.exact_match(symptoms)
+        if match is not None:
+            name = self.kb.diseases[match]
+            state["similarity_score"] = 1.0
+            state["retrieved_disease"] = DiseaseRecord(
+                name,
+                disease_id=match,
+                predicted=name,
+                matched=self.kb.matched_symptoms(symptoms, match),
+                source="knowledge_base",
+                kb=self.kb
+            )
+            return state
+
+        budget = remaining(state)
+        # One embedding per query, shared by the shard search and the similarity score
+        emb_q = np.array(self.embeddings.embed_query(query_text))
+        hits = self.index.search_by_vector(
+            emb_q.tolist(), k=5, timeout=None if budget == float("inf") else max(budget, 0.0)
+        )
+        if not hits:
             state["similarity_score"] = 0.0
-            state["retrieved_disease"] = {
-                "name": "Unknown",
-                "symptoms": symptoms,
-                "predicted_disease": "I don't know",
-                "matched_symptoms": [],
-                "description": "No match found",
-                "severity": "Unknown",
-                "treatment": "Consult healthcare provider"
-            }
+            state["retrieved_disease"] = DiseaseRecord("Unknown", predicted="I don't know", source="none")
             return state
 
-        top_doc, _ = docs_and_scores[0]
-        disease_meta = top_doc.metadata
-        disease_text = ", ".join(disease_meta.get("symptoms", []))
+        disease_meta, _ = hits[0]
+        disease_text = disease_meta.get("symptoms", "")
 
-        predicted = self.qa({"query": "Which diseases matches these symptoms: " + query_text})["result"].strip()
+        reason = None
+        try:
+            context = "\n".join(f"{meta.get('disease', '')}: {meta.get('symptoms', '')}" for meta, _ in hits)
+            predicted = call_limited(
+                "groq", state, self.qa.invoke,
+                {"context": context, "question": "Which diseases matches these symptoms: " + query_text}
+            ).content.strip()
+        except DeadlineExceeded:
+            reason = "time budget"
+        except ProviderUnavailable:
+            reason = "provider unavailable"
+        except Exception:
+            # 429/5xx and other Groq errors; the limiter has already recorded them
+            reason = "provider error"
 
-        emb_q = np.array(self.embeddings.embed_query("Which diseases matches these symptoms: " + query_text))
-        emb_d = np.array(self.embeddings.embed_query(f"This are the symptoms {disease_text} for the disease {predicted}"))
-        sim_score = self._cosine_sim(emb_q, emb_d)
-        if predicted.lower() == "i don't know":
+        if reason is None:
+            emb_d = np.array(self.embeddings.embed_query(f"This are the symptoms {disease_text} for the disease {predicted}"))
+            sim_score = self._cosine_sim(emb_q, emb_d)
+            if predicted.lower() == "i don't know":
+                sim_score = 0.0
+        else:
+            # Fall back to the nearest neighbour without LLM re-ranking
+            mark_degraded(state, f"disease re-ranking skipped ({reason})")
+            predicted = disease_meta.get("disease", "I don't know")
             sim_score = 0.0
 
-        matched = list(set(symptoms) & set(disease_meta.get("symptoms", [])))
+        # Keep the best candidate seen so far across refine loops
+        if state.get("retrieved_disease") and sim_score < state.get("similarity_score", 0.0):
+            return state
 
+        # Reference the shared knowledge-base entry instead of copying the shard metadata
+        disease_id = self.kb.index_of(disease_meta.get("disease", ""))
         state["similarity_score"] = sim_score
-        state["retrieved_disease"] = {
-            **disease_meta,
-            "predicted_disease": predicted,
-            "matched_symptoms": matched
-        }
+        state["retrieved_disease"] = DiseaseRecord(
+            self.kb.diseases[disease_id] if disease_id is not None else disease_meta.get("disease", "Unknown"),
+            disease_id=disease_id,
+            predicted=predicted,
+            matched=self.kb.matched_symptoms(symptoms, disease_id),
+            source="vector",
+            kb=self.kb
+        )
         return state
@@ -1,9 +1,14 @@
 import requests
 import json
 import logging
-from typing import List
+from typing import List, Optional
 from src.state.Agentstate import AgentState
+from src.state.records import DiseaseRecord, snippets
+from src.nodes import generate_response_node
+from src.graph.deadline import DeadlineExceeded, budget_timeout, mark_degraded, remaining, timeout_for
+from src.tools.rate_limit import call_limited, get_limiter
 import os
+import threading
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -15,16 +20,34 @@ class MedicalWebSearchAgent:
         # Hardcoded API keys
         self.serper_api_key = os.getenv('serper_api_key')
         self.serpapi_key = os.getenv('serpapi_key ')
+        # Endpoints are overridable so the agent can run against local stubs
+        self.serper_url = os.getenv('SERPER_URL', 'https://google.serper.dev/search')
+        self.serpapi_url = os.getenv('SERPAPI_URL', 'https://serpapi.com/search')
+        self.duckduckgo_enabled = os.getenv('DUCKDUCKGO_ENABLED', '1') == '1'
 
-    def _search_web(self, query: str, max_results: int = 5) -> str:
+    def _search_web(self, query: str, max_results: int = 5, state: Optional[AgentState] = None,
+                    cancel: Optional[threading.Event] = None) -> str:
         """
         Dynamic web search using multiple search engines with fallback
         Returns combined search results as text
+        Provider timeouts are clipped to the request deadline carried in ``state``
+        Each provider is rate limited; one whose circuit is open is skipped
+        Setting ``cancel`` stops the search before the next provider is tried
         """
+        state = state or {}
+
+        def cancelled() -> bool:
+            if cancel is not None and cancel.is_set():
+                logger.info(f"Web search cancelled: {query}")
+                return True
+            return False
+
         # Try Serper first
+        if cancelled():
+            return ""
         try:
             logger.info(f"Trying Serper search for: {query}")
-            url = "https://google.serper.dev/search"
+            url = self.serper_url
             payload = json.dumps({
                 "q": query,
                 "num": max_results,
@@ -36,8 +59,11 @@ class MedicalWebSearchAgent:
                 'Content-Type': 'application/json'
             }
             
-            response = requests.post(url, headers=headers, data=payload, timeout=10)
-            response.raise_for_status()
+            timeout = timeout_for(state, 10)
+            with get_limiter("serper").slot(timeout=remaining(state)):
+                with budget_timeout(timeout, 10, (requests.Timeout,)):
+                    response = requests.post(url, headers=headers, data=payload, timeout=timeout)
+                response.raise_for_status()
             
             data = response.json()
             results = []
@@ -55,6 +81,8 @@ class MedicalWebSearchAgent:
             logger.warning(f"Serper search failed: {e}")
 
         # Try SerpAPI second
+        if cancelled():
+            return ""
         try:
             logger.info(f"Trying SerpAPI search for: {query}")
             params = {
@@ -66,8 +94,11 @@ class MedicalWebSearchAgent:
                 'hl': 'en'
             }
             
-            response = requests.get('https://serpapi.com/search', params=params, timeout=10)
-            response.raise_for_status()
+            timeout = timeout_for(state, 10)
+            with get_limiter("serpapi").slot(timeout=remaining(state)):
+                with budget_timeout(timeout, 10, (requests.Timeout,)):
+                    response = requests.get(self.serpapi_url, params=params, timeout=timeout)
+                response.raise_for_status()
             
             data = response.json()
             results = []
@@ -85,18 +116,27 @@ class MedicalWebSearchAgent:
             logger.warning(f"SerpAPI search failed: {e}")
 
         # Try DuckDuckGo last
+        if cancelled():
+            return ""
         try:
+            if not self.duckduckgo_enabled:
+                raise RuntimeError("DuckDuckGo disabled")
+            if remaining(state) <= 0:
+                raise DeadlineExceeded("request deadline passed")
             logger.info(f"Trying DuckDuckGo search for: {query}")
             from duckduckgo_search import DDGS
             
+            def ddg_text():
+                with DDGS() as ddgs:
+                    return list(ddgs.text(query, max_results=max_results))
+
+            search_results = call_limited("duckduckgo", state, ddg_text)
+
             results = []
-            with DDGS() as ddgs:
-                search_results = ddgs.text(query, max_results=max_results)
-                
-                for result in search_results:
-                    title = result.get('title', '')
-                    body = result.get('body', '')
-                    results.append(f"{title}. {body}")
+            for result in search_results:
+                title = result.get('title', '')
+                body = result.get('body', '')
+                results.append(f"{title}. {body}")
             
             if results:
                 logger.info(f"DuckDuckGo search successful - {len(results)} results")
@@ -108,10 +148,12 @@ class MedicalWebSearchAgent:
             logger.warning(f"DuckDuckGo search failed: {e}")
 
         # All searches failed
+        if remaining(state) <= 0:
+            mark_degraded(state, "web search cut short (time budget)")
         logger.error("All search methods failed")
         return ""
 
-    def search_disease(self, state: AgentState) -> AgentState:
+    def search_disease(self, state: AgentState, cancel: Optional[threading.Event] = None) -> AgentState:
         """
         Search for disease/condition based on extracted symptoms
         """
@@ -119,11 +161,7 @@ class MedicalWebSearchAgent:
         
         if not symptoms:
             logger.warning("No symptoms found in state")
-            state["retrieved_disease"] = {
-                "name": "No symptoms provided",
-                "symptoms": [],
-                "search_results": ""
-            }
+            state["retrieved_disease"] = DiseaseRecord("No symptoms provided", source="web")
             return state
         
         try:
@@ -134,32 +172,27 @@ class MedicalWebSearchAgent:
             logger.info(f"Searching for disease with query: {search_query}")
             
             # Get search results
-            search_results = self._search_web(search_query, max_results=5)
+            search_results = self._search_web(search_query, max_results=5, state=state, cancel=cancel)
             
             if search_results:
                 # Extract disease name dynamically from search results
                 disease_name = self._extract_disease_name_from_text(search_results, symptoms)
                 
-                state["retrieved_disease"] = {
-                    "name": disease_name,
-                    "symptoms": symptoms,
-                    "search_results": search_results[:1000]  # Limit for storage
-                }
+                # Search text goes to the shared snippet store; state keeps only its key
+                state["retrieved_disease"] = DiseaseRecord(
+                    disease_name,
+                    source="web",
+                    snippet_id=snippets.put(search_results[:1000])  # Limit for storage
+                )
                 logger.info(f"Disease search completed: {disease_name}")
             else:
-                state["retrieved_disease"] = {
-                    "name": "Unable to determine from search",
-                    "symptoms": symptoms,
-                    "search_results": ""
-                }
+                state["retrieved_disease"] = DiseaseRecord("Unable to determine from search", source="web")
                 
         except Exception as e:
             logger.error(f"Disease search error: {e}")
-            state["retrieved_disease"] = {
-                "name": "Search error occurred",
-                "symptoms": symptoms,
-                "search_results": str(e)
-            }
+            state["retrieved_disease"] = DiseaseRecord(
+                "Search error occurred", source="web", snippet_id=snippets.put(str(e))
+            )
         
         return state
 
@@ -167,14 +200,14 @@ class MedicalWebSearchAgent:
         """
         Search for medicines based on identified disease or symptoms
         """
-        disease_info = state.get("retrieved_disease", {})
-        disease_name = disease_info.get("name", "")
-        symptoms = disease_info.get("symptoms", [])
+        disease_info = state.get("retrieved_disease")
+        disease_name = disease_info.name if disease_info is not None else ""
+        symptoms = state.get("extracted_symptoms", [])
         
         if not disease_name and not symptoms:
             logger.warning("No disease or symptoms found for medicine search")
             state["medicines"] = []
-            state["medicine_search_results"] = ""
+            state["medicine_snippet_id"] = None
             return state
         
         try:
@@ -188,14 +221,14 @@ class MedicalWebSearchAgent:
             logger.info(f"Searching for medicines with query: {search_query}")
             
             # Get search results
-            search_results = self._search_web(search_query, max_results=5)
+            search_results = self._search_web(search_query, max_results=5, state=state)
             
             if search_results:
                 # Extract medicines dynamically from search results
                 medicines = self._extract_medicines_from_text(search_results)
                 
                 state["medicines"] = medicines
-                state["medicine_search_results"] = search_results[:1000]  # Limit for storage
+                state["medicine_snippet_id"] = snippets.put(search_results[:1000])  # Limit for storage
                 
                 # Create final response
                 response = f"**Disease/Condition:** {disease_name}\n\n"
@@ -213,15 +246,19 @@ class MedicalWebSearchAgent:
                 logger.info(f"Medicine search completed: {len(medicines)} medicines found")
             else:
                 state["medicines"] = []
-                state["medicine_search_results"] = ""
+                state["medicine_snippet_id"] = None
                 state["final_response"] = f"**Disease/Condition:** {disease_name}\n\n**Medicine Search:** No results found."
                 
         except Exception as e:
             logger.error(f"Medicine search error: {e}")
             state["medicines"] = []
-            state["medicine_search_results"] = str(e)
+            state["medicine_snippet_id"] = snippets.put(str(e))
             state["final_response"] = f"**Disease/Condition:** {disease_name}\n\n**Medicine Search Error:** {str(e)}"
         
+        # The medicine answer replaces the diagnosis, so it carries the notice for the whole run
+        notice = generate_response_node.degraded_notice(state)
+        if notice:
+            state["final_response"] += "\n" + notice
         return state
 
     def _extract_disease_name_from_text(self, text: str, symptoms: List[str]) -> str:
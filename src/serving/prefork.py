@@ -0,0 +1,244 @@
+import argparse
+import gc
+import json
+import logging
+import os
+import signal
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def read_smaps_rollup(pid: int) -> Dict[str, float]:
+    """Memory breakdown of one process in MB, from /proc/<pid>/smaps_rollup"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in SMAPS_FIELDS:
+                values[key] = int(rest.split()[0]) / 1024
+    return {
+        "rss_mb": round(values.get("Rss", 0.0), 1),
+        "pss_mb": round(values.get("Pss", 0.0), 1),
+        "shared_mb": round(values.get("Shared_Clean", 0.0) + values.get("Shared_Dirty", 0.0), 1),
+        "unique_mb": round(values.get("Private_Clean", 0.0) + values.get("Private_Dirty", 0.0), 1),
+    }
+
+
+def child_pids(parent: int) -> List[int]:
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Field 4 is the parent pid; the command name in field 2 may contain spaces
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == parent:
+            pids.append(int(entry))
+    return sorted(pids)
+
+
+def memory_report(parent: Optional[int] = None) -> Dict[str, object]:
+    """Unique vs shared RSS for the parent and each worker (Linux only)"""
+    parent = parent or os.getpid()
+    workers = {}
+    for pid in child_pids(parent):
+        try:
+            workers[pid] = read_smaps_rollup(pid)
+        except OSError:
+            continue
+    parent_mem = read_smaps_rollup(parent)
+    return {
+        "parent": {"pid": parent, **parent_mem},
+        "workers": workers,
+        "total_unique_mb": round(parent_mem["unique_mb"] + sum(w["unique_mb"] for w in workers.values()), 1),
+        "total_pss_mb": round(parent_mem["pss_mb"] + sum(w["pss_mb"] for w in workers.values()), 1),
+    }
+
+
+class DiagnoseHandler(BaseHTTPRequestHandler):
+    """POST /diagnose {"query": ..., "medicine_request": false}; GET /_memory, /_metrics"""
+
+    graph = None
+    parent_pid = None
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _respond(self, status: int, payload: dict):
+        data = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/_memory":
+            self._respond(200, memory_report(self.parent_pid))
+        elif self.path == "/_metrics":
+            from src.tools.metrics import metrics
+
+            self._respond(200, {"worker": os.getpid(), **metrics.snapshot()})
+        else:
+            self._respond(404, {"error": "not found"})
+
+    def do_POST(self):
+        from src.graph.graph_builder import initial_state
+        from src.tools.rate_limit import ProviderUnavailable
+
+        if self.path != "/diagnose":
+            self._respond(404, {"error": "not found"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            query = str(body["query"])
+        except (ValueError, KeyError):
+            self._respond(400, {"error": "expected JSON body with a 'query' field"})
+            return
+
+        try:
+            result = self.graph.invoke(initial_state(query, bool(body.get("medicine_request", False))))
+        except ProviderUnavailable as e:
+            self._respond(503, {"error": str(e), "worker": os.getpid()})
+            return
+        except Exception as e:
+            logger.exception("Graph run failed")
+            self._respond(500, {"error": f"{type(e).__name__}: {e}", "worker": os.getpid()})
+            return
+        self._respond(200, {
+            "final_response": result.get("final_response", ""),
+            "extracted_symptoms": result.get("extracted_symptoms", []),
+            "similarity_score": result.get("similarity_score", 0.0),
+            "disease": getattr(result.get("retrieved_disease"), "name", None),
+            "medicines": result.get("medicines", []),
+            "degraded": result.get("degraded", []),
+            "worker": os.getpid(),
+        })
+
+
+class PreforkServer:
+    """
+    Load the graph (embedding model, FAISS shards, knowledge base) once in the
+    parent, freeze it, then fork workers that share those pages copy-on-write.
+    Each worker accepts on the same listening socket and gets its own slice
+    of CPUs for torch intra-op threads.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8000, workers: int = 2,
+                 precision: str = "fp32", report_interval: float = 60.0):
+        self.host = host
+        self.port = port
+        self.n_workers = workers
+        self.precision = precision
+        self.report_interval = report_interval
+        self.workers: Dict[int, int] = {}
+        self.cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+        self._running = True
+
+    def load(self):
+        import torch
+
+        # No intra-op pool in the parent: OpenMP thread pools do not survive fork()
+        torch.set_num_threads(1)
+        os.environ["EMBEDDING_PRECISION"] = self.precision
+        from src.graph.graph_builder import GraphHolder
+
+        holder = GraphHolder()
+        holder.rag.freeze()
+        DiagnoseHandler.graph = holder.app
+        DiagnoseHandler.parent_pid = os.getpid()
+        # Nothing may query the graph in the parent: the shard thread pool starts its
+        # threads lazily, and threads do not survive fork()
+
+        # Move everything loaded so far out of the GC's reach, so collections in
+        # workers don't touch (and un-share) the parent's object pages
+        gc.collect()
+        gc.freeze()
+        self.server = HTTPServer((self.host, self.port), DiagnoseHandler)
+        logger.info(f"Loaded graph in parent {os.getpid()} ({self.precision}); listening on {self.host}:{self.port}")
+
+    def _cpu_slice(self, slot: int) -> List[int]:
+        per_worker = max(1, len(self.cpus) // self.n_workers)
+        start = (slot * per_worker) % len(self.cpus)
+        return self.cpus[start:start + per_worker]
+
+    def _spawn(self, slot: int):
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = slot
+            return
+        # Worker
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        import torch
+
+        from src.tools.rate_limit import set_process_share
+
+        # Provider limits are per process: split them so all workers together stay within them
+        set_process_share(1 / self.n_workers)
+        cpus = self._cpu_slice(slot)
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cpus)
+        torch.set_num_threads(len(cpus))
+        logger.info(f"Worker {os.getpid()} serving on CPUs {cpus}")
+        try:
+            self.server.serve_forever()
+        finally:
+            os._exit(0)
+
+    def _stop(self, signum, frame):
+        self._running = False
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        self.load()
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for slot in range(self.n_workers):
+            self._spawn(slot)
+
+        next_report = time.monotonic() + self.report_interval
+        while self._running or self.workers:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                slot = self.workers.pop(pid, None)
+                if self._running and slot is not None:
+                    logger.warning(f"Worker {pid} exited; respawning")
+                    self._spawn(slot)
+                continue
+            if self._running and time.monotonic() >= next_report:
+                logger.info(f"Memory report: {json.dumps(memory_report())}")
+                next_report = time.monotonic() + self.report_interval
+            time.sleep(0.5)
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the diagnosis graph from pre-forked workers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--precision", choices=["fp32", "int8"], default="fp32")
+    parser.add_argument("--report-interval", type=float, default=60.0, help="seconds between memory reports")
+    args = parser.parse_args()
+    PreforkServer(args.host, args.port, args.workers, args.precision, args.report_interval).run()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -1,15 +1,20 @@
-from typing import List, Dict, Any,TypedDict, Annotated
+from typing import List, Dict, TypedDict, Annotated, Optional
 from langgraph.graph.message import add_messages
+from src.state.records import DiseaseRecord
 
 class AgentState(TypedDict):
     user_query: str
     extracted_symptoms: List[str]
     similarity_score: float
-    retrieved_disease: Dict[str, Any]
+    retrieved_disease: Optional[DiseaseRecord]
     refined_query: str
     retry_count: int
     final_response: str
     medicine_request: bool
     medicines: List[str]
+    medicine_snippet_id: Optional[int]
     conversation_history: List[Dict[str, str]]
-    messages: Annotated[List[Dict[str, str]], add_messages]
\ No newline at end of file
+    messages: Annotated[List[Dict[str, str]], add_messages]
+    deadline: float
+    degraded: List[str]
+    speculation_id: str
\ No newline at end of file
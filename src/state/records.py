@@ -0,0 +1,141 @@
+import sys
+import threading
+from collections import OrderedDict
+from itertools import count
+from typing import Any, Dict, Optional, Tuple
+
+# How many symptoms of the knowledge-base record to show in a rendered description
+DESCRIPTION_SYMPTOMS = 10
+
+
+class SnippetStore:
+    """
+    Bounded, process-wide LRU for web-search text.
+    State keeps only the integer key, so graph snapshots don't copy the text.
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._items: "OrderedDict[int, str]" = OrderedDict()
+        self._ids = count(1)
+        self._lock = threading.Lock()
+
+    def put(self, text: str) -> Optional[int]:
+        if not text:
+            return None
+        with self._lock:
+            key = next(self._ids)
+            self._items[key] = text
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+            return key
+
+    def get(self, key: Optional[int]) -> str:
+        if key is None:
+            return ""
+        with self._lock:
+            return self._items.get(key, "")
+
+
+snippets = SnippetStore()
+
+# Knowledge base that unpickled records point at; see attach_knowledge_base
+_shared_kb = None
+
+
+def attach_knowledge_base(kb):
+    """Register the process's shared DiseaseKnowledgeBase, which unpickled records re-attach to"""
+    global _shared_kb
+    _shared_kb = kb
+
+
+def _restore_record(name, disease_id, predicted, matched, source, snippet_id, had_kb):
+    return DiseaseRecord(name, disease_id, predicted, matched, source, snippet_id, _shared_kb if had_kb else None)
+
+
+class DiseaseRecord:
+    """
+    Compact, immutable reference to a diagnosis candidate kept in AgentState.
+    Full metadata (symptom list, search text) is resolved from the shared
+    knowledge base and snippet store only when the response is rendered.
+    """
+
+    __slots__ = ("name", "disease_id", "predicted", "matched", "source", "snippet_id", "kb")
+
+    def __init__(self, name: str, disease_id: Optional[int] = None, predicted: str = "",
+                 matched: Tuple[str, ...] = (), source: str = "vector",
+                 snippet_id: Optional[int] = None, kb=None):
+        set_slot = object.__setattr__
+        set_slot(self, "name", name)
+        set_slot(self, "disease_id", disease_id)
+        set_slot(self, "predicted", predicted)
+        set_slot(self, "matched", tuple(matched))
+        set_slot(self, "source", source)
+        set_slot(self, "snippet_id", snippet_id)
+        # Shared DiseaseKnowledgeBase; a pointer, never copied
+        set_slot(self, "kb", kb)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"DiseaseRecord is immutable; cannot set {name!r}")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"DiseaseRecord is immutable; cannot delete {name!r}")
+
+    # Immutable, so state snapshots can share the record (and its knowledge-base pointer)
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        # The knowledge base is never serialized; the receiving process supplies its own
+        fields = tuple(getattr(self, s) for s in DiseaseRecord.__slots__ if s != "kb")
+        return (_restore_record, fields + (self.kb is not None,))
+
+    def __repr__(self):
+        return f"DiseaseRecord({self.name!r}, id={self.disease_id}, source={self.source!r})"
+
+    @property
+    def search_results(self) -> str:
+        return snippets.get(self.snippet_id)
+
+    def resolve(self) -> Dict[str, Any]:
+        """Full, render-ready view of the record"""
+        symptoms = self.kb.symptoms_of(self.disease_id) if self.kb is not None and self.disease_id is not None else []
+        if symptoms:
+            description = "Commonly reported symptoms include " + ", ".join(symptoms[:DESCRIPTION_SYMPTOMS]) + "."
+        elif self.snippet_id is not None:
+            description = self.search_results[:300]
+        else:
+            description = "No description available."
+        return {
+            "name": self.name,
+            "predicted_disease": self.predicted or self.name,
+            "matched_symptoms": list(self.matched),
+            "symptoms": symptoms,
+            "search_results": self.search_results,
+            "description": description,
+            "severity": "Unknown - please consult a healthcare provider",
+            "treatment": "Consult a healthcare provider for an appropriate treatment plan",
+            "source": self.source,
+        }
+
+
+def state_footprint(obj, _seen=None) -> int:
+    """
+    Approximate bytes held by a state value, following containers and slotted
+    records but not the shared knowledge base they point to.
+    """
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(state_footprint(k, seen) + state_footprint(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(state_footprint(v, seen) for v in obj)
+    elif isinstance(obj, DiseaseRecord):
+        size += sum(state_footprint(getattr(obj, s), seen) for s in DiseaseRecord.__slots__ if s != "kb")
+    return size
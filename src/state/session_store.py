@@ -0,0 +1,142 @@
+import json
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+from src.tools.metrics import metrics as app_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _Session:
+    __slots__ = ("history", "last_access")
+
+    def __init__(self, history: List[Dict[str, str]]):
+        self.history = history
+        self.last_access = time.monotonic()
+
+
+class SessionStore:
+    """
+    Chat history for many concurrent sessions.
+    History is capped to the last ``max_messages`` entries and written through to
+    SQLite, so idle sessions can be dropped from RAM and rehydrated on next access,
+    and nothing is lost when the process restarts.
+    """
+
+    def __init__(
+        self,
+        db_path: str = "sessions.db",
+        max_messages: int = 20,
+        idle_seconds: float = 900.0,
+        max_resident: int = 1000,
+    ):
+        self.max_messages = max_messages
+        self.idle_seconds = idle_seconds
+        self.max_resident = max_resident
+        self._sessions: Dict[str, _Session] = {}
+        self._lock = threading.RLock()
+        self._evictions = 0
+        self._rehydrations = 0
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, history TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        app_metrics.register_collector("sessions", self.metrics)
+
+    def _load(self, session_id: str) -> _Session:
+        session = self._sessions.get(session_id)
+        if session is None:
+            row = self._conn.execute(
+                "SELECT history FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is not None:
+                self._rehydrations += 1
+            session = _Session(json.loads(row[0]) if row else [])
+            self._sessions[session_id] = session
+            self._enforce_resident_limit()
+        session.last_access = time.monotonic()
+        return session
+
+    def _persist(self, session_id: str, session: _Session):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, history, updated_at) VALUES (?, ?, ?)",
+            (session_id, json.dumps(session.history), time.time()),
+        )
+        self._conn.commit()
+
+    def get(self, session_id: str) -> List[Dict[str, str]]:
+        """Return a copy of the (capped) history for a session"""
+        with self._lock:
+            self.evict_idle()
+            return list(self._load(session_id).history)
+
+    def append(self, session_id: str, role: str, content: str):
+        with self._lock:
+            session = self._load(session_id)
+            session.history.append({"role": role, "content": content})
+            if len(session.history) > self.max_messages:
+                del session.history[:-self.max_messages]
+            self._persist(session_id, session)
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def evict_idle(self) -> int:
+        """Drop sessions idle for longer than ``idle_seconds`` from RAM; they stay on disk"""
+        with self._lock:
+            cutoff = time.monotonic() - self.idle_seconds
+            idle = [sid for sid, s in self._sessions.items() if s.last_access < cutoff]
+            for sid in idle:
+                del self._sessions[sid]
+            self._evictions += len(idle)
+            return len(idle)
+
+    def _enforce_resident_limit(self):
+        overflow = len(self._sessions) - self.max_resident
+        if overflow > 0:
+            oldest = sorted(self._sessions, key=lambda sid: self._sessions[sid].last_access)[:overflow]
+            for sid in oldest:
+                del self._sessions[sid]
+            self._evictions += overflow
+
+    @staticmethod
+    def _session_bytes(session: _Session) -> int:
+        size = sys.getsizeof(session) + sys.getsizeof(session.history)
+        for message in session.history:
+            size += sys.getsizeof(message)
+            size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in message.items())
+        return size
+
+    def metrics(self, session_id: Optional[str] = None) -> Dict[str, float]:
+        """Resident session count and approximate memory per session"""
+        with self._lock:
+            sizes = {sid: self._session_bytes(s) for sid, s in self._sessions.items()}
+            stored = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            metrics = {
+                "resident_sessions": len(sizes),
+                "stored_sessions": stored,
+                "resident_bytes": sum(sizes.values()),
+                "max_session_bytes": max(sizes.values(), default=0),
+                "avg_session_bytes": sum(sizes.values()) / len(sizes) if sizes else 0.0,
+                "evictions": self._evictions,
+                "rehydrations": self._rehydrations,
+            }
+            if session_id is not None:
+                metrics["session_bytes"] = sizes.get(session_id, 0)
+            return metrics
+
+    def close(self):
+        with self._lock:
+            self._sessions.clear()
+            self._conn.close()
@@ -0,0 +1,80 @@
+import threading
+from collections import deque
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+
+HISTOGRAM_WINDOW = 1024
+
+
+def _key(name: str, labels: Dict[str, str]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    return name, tuple(sorted(labels.items()))
+
+
+def _render(key) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+class Metrics:
+    """
+    Process-wide counters, gauges and latency windows.
+    Components with their own stats (shards, session store) register a
+    collector so one snapshot covers the whole app.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[tuple, float] = {}
+        self._gauges: Dict[tuple, float] = {}
+        self._histograms: Dict[tuple, deque] = {}
+        self._collectors: Dict[str, Callable[[], dict]] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._histograms.setdefault(key, deque(maxlen=HISTOGRAM_WINDOW)).append(value)
+
+    def register_collector(self, name: str, collector: Callable[[], dict]):
+        with self._lock:
+            self._collectors[name] = collector
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            counters = {_render(k): v for k, v in self._counters.items()}
+            gauges = {_render(k): v for k, v in self._gauges.items()}
+            windows = {_render(k): np.array(v) for k, v in self._histograms.items() if v}
+            collectors = dict(self._collectors)
+
+        histograms = {
+            name: {
+                "count": len(values),
+                "mean": float(values.mean()),
+                "p50": float(np.percentile(values, 50)),
+                "p95": float(np.percentile(values, 95)),
+                "max": float(values.max()),
+            }
+            for name, values in windows.items()
+        }
+        snapshot = {"counters": counters, "gauges": gauges, "histograms": histograms}
+        for name, collector in collectors.items():
+            try:
+                snapshot[name] = collector()
+            except Exception as e:
+                snapshot[name] = {"error": str(e)}
+        return snapshot
+
+
+# Shared registry for the whole process
+metrics = Metrics()
@@ -0,0 +1,287 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from itertools import count
+from typing import Dict, Optional
+
+from src.graph.deadline import DeadlineExceeded, call_with_deadline, remaining
+from src.tools.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# rate: requests/second, burst: bucket size, max_concurrency: in-flight cap,
+# failure_threshold: consecutive failures that open the circuit, cooldown: seconds it stays open
+DEFAULT_LIMITS = {
+    "gemini": {"rate": 10.0, "burst": 10, "max_concurrency": 8},
+    "groq": {"rate": 5.0, "burst": 5, "max_concurrency": 4},
+    "refine": {"rate": 5.0, "burst": 5, "max_concurrency": 4},
+    "serper": {"rate": 5.0, "burst": 10, "max_concurrency": 8},
+    "serpapi": {"rate": 2.0, "burst": 4, "max_concurrency": 4},
+    "duckduckgo": {"rate": 1.0, "burst": 2, "max_concurrency": 2},
+}
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_COOLDOWN = 30.0
+# Longest a caller queues for a slot when it has no deadline of its own
+DEFAULT_MAX_WAIT = 10.0
+
+
+class ProviderUnavailable(RuntimeError):
+    """Raised when a provider's circuit is open or no slot frees up in time"""
+
+
+def _status_of(exc: BaseException) -> Optional[int]:
+    """HTTP status carried by a requests/httpx/SDK exception, if any"""
+    for attr in ("status_code", "code", "status"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or HTTP-date), if present"""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class ProviderLimiter:
+    """
+    Token bucket + concurrency cap + circuit breaker for one external provider.
+    Waiters are served strictly first-come first-served.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, max_concurrency: int,
+                 failure_threshold: int = DEFAULT_FAILURE_THRESHOLD, cooldown: float = DEFAULT_COOLDOWN):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        self._cond = threading.Condition()
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._in_flight = 0
+        self._tickets = count()
+        self._queue = []
+        self._blocked_until = 0.0
+        self._failures = 0
+        self._open_until = 0.0
+        self._half_open_trial = False
+
+    # ------------------------------------------------------------ circuit
+
+    def available(self) -> bool:
+        """False while the circuit is open; lets callers skip the provider entirely"""
+        with self._cond:
+            return time.monotonic() >= self._open_until
+
+    def _circuit_state(self, now: float) -> str:
+        if now < self._open_until:
+            return "open"
+        if self._failures >= self.failure_threshold:
+            return "half_open"
+        return "closed"
+
+    def record_success(self):
+        with self._cond:
+            self._failures = 0
+            self._half_open_trial = False
+            metrics.set("provider_circuit_open", 0, provider=self.name)
+        metrics.inc("provider_requests_total", provider=self.name, outcome="ok")
+
+    def record_failure(self, exc: BaseException):
+        status = _status_of(exc)
+        if status is not None and status != 429 and status < 500:
+            # Client errors mean the provider answered: treat it as healthy
+            with self._cond:
+                self._failures = 0
+                self._half_open_trial = False
+                self._cond.notify_all()
+            metrics.inc("provider_requests_total", provider=self.name, outcome="client_error")
+            return
+
+        retry_after = _retry_after(exc) if status == 429 else None
+        with self._cond:
+            now = time.monotonic()
+            if retry_after is not None:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            self._failures += 1
+            if self._half_open_trial or self._failures >= self.failure_threshold:
+                self._open_until = now + max(self.cooldown, retry_after or 0.0)
+                self._half_open_trial = False
+                metrics.set("provider_circuit_open", 1, provider=self.name)
+                logger.warning(f"{self.name}: circuit open for {self._open_until - now:.0f}s after {self._failures} failures")
+            self._cond.notify_all()
+        metrics.inc("provider_requests_total", provider=self.name, outcome="throttled" if status == 429 else "error")
+
+    # ----------------------------------------------------------- admission
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _acquire(self, timeout: Optional[float]) -> bool:
+        """Take a slot; returns True when it is the circuit's half-open trial"""
+        wait_limit = DEFAULT_MAX_WAIT if timeout is None or math.isinf(timeout) else timeout
+        start = time.monotonic()
+        give_up = start + max(0.0, wait_limit)
+        with self._cond:
+            ticket = next(self._tickets)
+            self._queue.append(ticket)
+            metrics.set("provider_queue_depth", len(self._queue), provider=self.name)
+            try:
+                while True:
+                    now = time.monotonic()
+                    state = self._circuit_state(now)
+                    if state == "open":
+                        metrics.inc("provider_requests_total", provider=self.name, outcome="circuit_open")
+                        raise ProviderUnavailable(f"{self.name} is cooling down after repeated failures")
+
+                    self._refill(now)
+                    head = self._queue[0] == ticket
+                    # In half-open state only one trial request goes through
+                    trial_busy = state == "half_open" and self._half_open_trial
+                    if (head and not trial_busy and now >= self._blocked_until
+                            and self._tokens >= 1 and self._in_flight < self.max_concurrency):
+                        self._tokens -= 1
+                        self._in_flight += 1
+                        trial = state == "half_open"
+                        if trial:
+                            self._half_open_trial = True
+                        break
+
+                    if now >= give_up:
+                        metrics.inc("provider_requests_total", provider=self.name, outcome="queue_timeout")
+                        raise ProviderUnavailable(f"No {self.name} slot within {wait_limit:.1f}s")
+                    wake = give_up - now
+                    if now < self._blocked_until:
+                        wake = min(wake, self._blocked_until - now)
+                    elif self._tokens < 1:
+                        wake = min(wake, (1 - self._tokens) / self.rate)
+                    # Otherwise we are behind the concurrency cap, the queue head or the
+                    # half-open trial, all of which notify when they change
+                    self._cond.wait(wake)
+            finally:
+                self._queue.remove(ticket)
+                metrics.set("provider_queue_depth", len(self._queue), provider=self.name)
+                metrics.set("provider_in_flight", self._in_flight, provider=self.name)
+                self._cond.notify_all()
+        metrics.observe("provider_wait_seconds", time.monotonic() - start, provider=self.name)
+        return trial
+
+    def _release(self, trial: bool = False):
+        with self._cond:
+            self._in_flight -= 1
+            if trial:
+                # A trial that ended without a verdict (deadline, cancellation) lets the next one through
+                self._half_open_trial = False
+            metrics.set("provider_in_flight", self._in_flight, provider=self.name)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, timeout: Optional[float] = None):
+        """
+        Wait (at most ``timeout`` seconds) for a fair turn within the rate and
+        concurrency limits, then run the block and record its outcome.
+        """
+        trial = self._acquire(timeout)
+        start = time.monotonic()
+        # Anything that is neither a result nor an Exception (e.g. GeneratorExit) only frees the slot
+        outcome, error = "aborted", None
+        try:
+            yield
+            outcome = "ok"
+        except DeadlineExceeded:
+            # The request ran out of time, which says nothing about the provider's health
+            outcome = "deadline"
+            raise
+        except Exception as e:
+            outcome, error = "error", e
+            raise
+        finally:
+            if outcome == "ok":
+                self.record_success()
+            elif outcome == "error":
+                self.record_failure(error)
+            else:
+                metrics.inc("provider_requests_total", provider=self.name, outcome=outcome)
+            self._release(trial)
+            metrics.observe("provider_latency_seconds", time.monotonic() - start, provider=self.name)
+
+
+_limiters: Dict[str, ProviderLimiter] = {}
+_limiters_lock = threading.Lock()
+# Fraction of every provider's limits this process may use; see set_process_share
+_process_share = 1.0
+
+
+def set_process_share(share: float):
+    """
+    Give this process ``share`` of each provider's rate, burst and concurrency,
+    so N processes started with 1/N stay within the configured limits together.
+    Burst and concurrency never drop below 1. Existing limiters are replaced.
+    """
+    global _process_share
+    with _limiters_lock:
+        _process_share = share
+        _limiters.clear()
+
+
+def _configured_limits() -> Dict[str, dict]:
+    """DEFAULT_LIMITS merged with the RATE_LIMITS env var (JSON, e.g. '{"serper": {"rate": 2}}')"""
+    limits = {name: dict(cfg) for name, cfg in DEFAULT_LIMITS.items()}
+    for name, cfg in json.loads(os.getenv("RATE_LIMITS", "{}")).items():
+        limits.setdefault(name, {"rate": 5.0, "burst": 5, "max_concurrency": 4}).update(cfg)
+    return limits
+
+
+def get_limiter(provider: str) -> ProviderLimiter:
+    """
+    Process-wide limiter for ``provider``. State is not shared between
+    processes: under the pre-fork server each worker gets 1/N of the limits,
+    but keeps its own circuit breaker and metrics.
+    """
+    with _limiters_lock:
+        if provider not in _limiters:
+            cfg = dict(_configured_limits().get(provider, {"rate": 5.0, "burst": 5, "max_concurrency": 4}))
+            cfg["rate"] = cfg["rate"] * _process_share
+            cfg["burst"] = max(1, int(cfg["burst"] * _process_share))
+            cfg["max_concurrency"] = max(1, int(cfg["max_concurrency"] * _process_share))
+            _limiters[provider] = ProviderLimiter(provider, **cfg)
+        return _limiters[provider]
+
+
+def call_limited(provider: str, state, fn, *args, **kwargs):
+    """
+    Run ``fn`` in a ``provider`` slot and give up at the state's deadline.
+    The slot is taken and released on call_with_deadline's worker thread, so a
+    call abandoned at the deadline keeps counting against ``max_concurrency``
+    until it really finishes.
+    """
+    limiter = get_limiter(provider)
+
+    def limited():
+        with limiter.slot(timeout=remaining(state)):
+            return fn(*args, **kwargs)
+
+    limited.__name__ = getattr(fn, "__name__", provider)
+    return call_with_deadline(state, limited)
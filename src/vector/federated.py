@@ -0,0 +1,169 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.vectorstores import FAISS
+
+from src.vector.ingest import CanonicalDataset, normalize_disease
+
+logger = logging.getLogger(__name__)
+
+# FAISS shard per ingested source (see src.vector.ingest.DEFAULT_SOURCES)
+DEFAULT_SHARDS = {
+    "conditions": {"vector_db_path": "disease_db", "weight": 1.0},
+    "prognosis": {"vector_db_path": "disease_db_prognosis", "weight": 0.7},
+    "narratives": {"vector_db_path": "disease_db_narratives", "weight": 1.0},
+}
+
+# Reciprocal rank fusion constant
+RRF_K = 60
+LATENCY_WINDOW = 512
+
+
+class IndexShard:
+    """One named FAISS index over a single corpus, with its own latency stats"""
+
+    def __init__(self, name: str, embeddings, vector_db_path: str, weight: float = 1.0,
+                 dataset: Optional[Callable[[], CanonicalDataset]] = None):
+        self.name = name
+        self.vector_db_path = vector_db_path
+        self.weight = weight
+        self.latencies_ms = deque(maxlen=LATENCY_WINDOW)
+        self.errors = 0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+        self.db = self._build_or_load(embeddings, dataset)
+
+    def _build_or_load(self, embeddings, dataset: Optional[Callable[[], CanonicalDataset]]):
+        if os.path.exists(self.vector_db_path):
+            return FAISS.load_local(self.vector_db_path, embeddings, allow_dangerous_deserialization=True)
+
+        # The canonical dataset is already normalized and deduplicated across sources
+        documents = list(dataset().documents(self.name)) if dataset is not None else []
+        if not documents:
+            raise FileNotFoundError(f"No index at {self.vector_db_path} and no ingested documents for {self.name}")
+        texts, metadata = map(list, zip(*documents))
+
+        db = FAISS.from_texts(texts, embeddings, metadatas=metadata)
+        db.save_local(self.vector_db_path)
+        logger.info(f"Built shard {self.name} - {len(texts)} documents")
+        return db
+
+    def search(self, embedding: List[float], k: int):
+        start = time.perf_counter()
+        try:
+            return self.db.similarity_search_with_score_by_vector(embedding, k=k)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self.latencies_ms.append((time.perf_counter() - start) * 1000)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            samples = np.array(self.latencies_ms) if self.latencies_ms else np.zeros(1)
+            return {
+                "weight": self.weight,
+                "queries": len(self.latencies_ms),
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "mean_ms": float(samples.mean()),
+                "p50_ms": float(np.percentile(samples, 50)),
+                "p95_ms": float(np.percentile(samples, 95)),
+                "max_ms": float(samples.max()),
+            }
+
+
+class FederatedIndex:
+    """
+    Several IndexShards queried concurrently with one shared query embedding.
+    Per-shard hits are grouped by disease and merged with weighted reciprocal
+    rank fusion ("rrf") or weighted min-max normalized similarity ("score").
+    Missing shard indexes are built from ``dataset``, a callable returning the
+    canonical ingested dataset; it is only called when something must be built.
+    """
+
+    def __init__(self, embeddings, shards: Optional[Dict[str, dict]] = None, fusion: str = "rrf",
+                 dataset: Optional[Callable[[], CanonicalDataset]] = None):
+        if fusion not in ("rrf", "score"):
+            raise ValueError(f"Unknown fusion method: {fusion}")
+        self.embeddings = embeddings
+        self.fusion = fusion
+        self.shards: Dict[str, IndexShard] = {}
+        for name, cfg in (shards or DEFAULT_SHARDS).items():
+            try:
+                self.shards[name] = IndexShard(name, embeddings, dataset=dataset, **cfg)
+            except FileNotFoundError as e:
+                logger.warning(f"Skipping shard {name}: {e}")
+        self._pool = ThreadPoolExecutor(max_workers=max(1, len(self.shards)), thread_name_prefix="shard")
+
+    def search(self, query: str, k: int = 5, timeout: Optional[float] = None) -> List[Tuple[dict, float]]:
+        """
+        Return up to ``k`` (metadata, fused score) pairs, best first.
+        Shards that have not answered within ``timeout`` seconds are left out.
+        """
+        return self.search_by_vector(self.embeddings.embed_query(query), k, timeout)
+
+    def search_by_vector(self, embedding: List[float], k: int = 5,
+                         timeout: Optional[float] = None) -> List[Tuple[dict, float]]:
+        """search() with a query embedding the caller already has"""
+        # Over-fetch so shards with several hits per disease still yield k distinct diseases
+        futures = {self._pool.submit(shard.search, embedding, 2 * k): shard for shard in self.shards.values()}
+        done, pending = wait(futures, timeout=timeout)
+
+        per_shard = {}
+        for future in pending:
+            shard = futures[future]
+            future.cancel()
+            with shard._lock:
+                shard.timeouts += 1
+            logger.warning(f"Shard {shard.name} timed out")
+        for future in done:
+            shard = futures[future]
+            try:
+                per_shard[shard.name] = future.result()
+            except Exception as e:
+                logger.warning(f"Shard {shard.name} failed: {e}")
+
+        return self._fuse(per_shard, k)
+
+    def _fuse(self, per_shard: Dict[str, list], k: int) -> List[Tuple[dict, float]]:
+        fused: Dict[str, float] = {}
+        best_meta: Dict[str, Tuple[float, dict]] = {}
+
+        for name, hits in per_shard.items():
+            if not hits:
+                continue
+            shard = self.shards[name]
+            # FAISS returns L2 distances; smaller is closer
+            sims = np.array([1.0 / (1.0 + float(d)) for _, d in hits])
+            if self.fusion == "score":
+                span = sims.max() - sims.min()
+                contributions = (sims - sims.min()) / span if span > 0 else np.ones(len(sims))
+            else:
+                contributions = 1.0 / (RRF_K + np.arange(1, len(hits) + 1))
+
+            seen = set()
+            for (doc, _), contribution, sim in zip(hits, contributions, sims):
+                key = normalize_disease(doc.metadata.get("disease", ""))
+                if not key or key in seen:
+                    continue
+                seen.add(key)
+                fused[key] = fused.get(key, 0.0) + shard.weight * float(contribution)
+                # Prefer metadata from the highest-weighted, closest shard hit
+                rank_key = shard.weight * float(sim)
+                if key not in best_meta or rank_key > best_meta[key][0]:
+                    best_meta[key] = (rank_key, doc.metadata)
+
+        ranked = sorted(fused.items(), key=lambda kv: kv[1], reverse=True)[:k]
+        return [(best_meta[key][1], score) for key, score in ranked]
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {name: shard.stats() for name, shard in self.shards.items()}
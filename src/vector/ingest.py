@@ -0,0 +1,294 @@
+import argparse
+import logging
+import os
+import re
+import tempfile
+import time
+from itertools import chain
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Bundled corpora in priority order: the first source to name a disease picks its display name.
+# In final_diseasevssymptoms.csv, 805 of 1109 rows leave "prognosis" empty and carry a
+# "diagnosis" instead. Those labels are assigned in blocks of ~20 that don't match the
+# symptoms (e.g. "Migraine" for blood in the urine), so the rows are deliberately skipped
+DEFAULT_SOURCES = {
+    "conditions": {"path": "Dataset_cleaned.csv", "disease_col": "disease", "text_col": "symptoms", "kind": "symptom_list"},
+    "prognosis": {"path": "datasets/final_diseasevssymptoms.csv", "disease_col": "prognosis", "text_col": "symptoms", "kind": "symptom_list"},
+    "narratives": {"path": "datasets/diseassVssymptoms1.csv", "disease_col": "label", "text_col": "text", "kind": "narrative"},
+}
+DEFAULT_CHUNKSIZE = 200_000
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_symptom(token: str) -> str:
+    """Canonical form of a symptom token ("skin_rash", "dischromic _patches" -> "skin rash", "dischromic patches")"""
+    return _WS_RE.sub(" ", str(token).replace("_", " ")).strip().lower()
+
+
+def normalize_disease(name: str) -> str:
+    """Key used to deduplicate disease names across sources"""
+    return _WS_RE.sub(" ", str(name)).strip().lower()
+
+
+def split_symptoms(raw) -> List[str]:
+    """Split a comma-joined CSV symptom cell into normalized tokens"""
+    if not isinstance(raw, str):
+        return []
+    return [t for t in (normalize_symptom(s) for s in raw.split(",")) if t]
+
+
+def normalize_symptom_series(tokens: pd.Series) -> pd.Series:
+    """Vectorized normalize_symptom"""
+    return tokens.str.replace("_", " ", regex=False).str.replace(r"\s+", " ", regex=True).str.strip().str.lower()
+
+
+def clean_disease_series(names: pd.Series) -> pd.Series:
+    """Vectorized display-name cleanup (whitespace only; case is kept for display)"""
+    return names.str.replace(r"\s+", " ", regex=True).str.strip()
+
+
+def _pack_strings(values: List[str]):
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(blob: np.ndarray, offsets: np.ndarray) -> List[str]:
+    raw = blob.tobytes()
+    return [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+class CanonicalDataset:
+    """
+    Single normalized, deduplicated view of every disease corpus.
+
+    Columns are integer-coded: ``pair_*`` is the (disease, symptom, source)
+    relation from the curated symptom-list sources, ``doc_*`` holds free-text
+    documents (narratives). Diseases are sorted by normalized key, symptoms
+    alphabetically.
+    """
+
+    def __init__(self, diseases: List[str], vocab: List[str], sources: List[str],
+                 pair_disease: np.ndarray, pair_symptom: np.ndarray, pair_source: np.ndarray,
+                 doc_disease: np.ndarray, doc_source: np.ndarray, doc_texts: List[str]):
+        self.diseases = diseases
+        self.vocab = vocab
+        self.sources = sources
+        self.pair_disease = pair_disease
+        self.pair_symptom = pair_symptom
+        self.pair_source = pair_source
+        self.doc_disease = doc_disease
+        self.doc_source = doc_source
+        self.doc_texts = doc_texts
+
+    def save(self, path: str):
+        columns = {}
+        for name in ("diseases", "vocab", "sources", "doc_texts"):
+            columns[f"{name}_blob"], columns[f"{name}_offsets"] = _pack_strings(getattr(self, name))
+        for name in ("pair_disease", "pair_symptom", "pair_source", "doc_disease", "doc_source"):
+            columns[name] = getattr(self, name)
+        with open(path, "wb") as f:
+            np.savez(f, **columns)
+
+    @classmethod
+    def load(cls, path: str) -> "CanonicalDataset":
+        with np.load(path, allow_pickle=False) as data:
+            strings = {
+                name: _unpack_strings(data[f"{name}_blob"], data[f"{name}_offsets"])
+                for name in ("diseases", "vocab", "sources", "doc_texts")
+            }
+            return cls(
+                strings["diseases"], strings["vocab"], strings["sources"],
+                data["pair_disease"], data["pair_symptom"], data["pair_source"],
+                data["doc_disease"], data["doc_source"], strings["doc_texts"],
+            )
+
+    def symptoms_by_disease(self, source: Optional[str] = None) -> Dict[int, List[str]]:
+        """Disease id -> sorted symptom list, optionally restricted to one source"""
+        mask = np.ones(len(self.pair_disease), dtype=bool)
+        if source is not None:
+            mask = self.pair_source == self.sources.index(source)
+        frame = pd.DataFrame({"d": self.pair_disease[mask], "s": self.pair_symptom[mask]}).drop_duplicates()
+        frame = frame.sort_values(["d", "s"])
+        return {int(d): [self.vocab[s] for s in group["s"]] for d, group in frame.groupby("d", sort=False)}
+
+    def documents(self, source: str):
+        """(text, metadata) pairs for an index over ``source``"""
+        if source not in self.sources:
+            return
+        source_id = self.sources.index(source)
+        rows = np.flatnonzero(self.doc_source == source_id)
+        if len(rows):
+            for i in rows:
+                disease, text = self.diseases[self.doc_disease[i]], self.doc_texts[i]
+                yield text, {"disease": disease, "symptoms": text, "source": source}
+        else:
+            # Symptom-list sources collapse to one document per disease
+            for d, symptoms in self.symptoms_by_disease(source).items():
+                body = ", ".join(symptoms)
+                yield f"{self.diseases[d]}: {body}", {"disease": self.diseases[d], "symptoms": body, "source": source}
+
+
+def _read_chunks(path: str, cols: List[str], chunksize: int) -> Iterator[pd.DataFrame]:
+    # usecols drops stray index columns; dtype=str avoids per-column inference
+    yield from pd.read_csv(path, usecols=cols, dtype=str, chunksize=chunksize)
+
+
+def _symptom_pairs(path: str, disease_col: str, text_col: str, chunksize: int) -> pd.DataFrame:
+    """Long (disease, symptom) table from a comma-joined symptom column, deduplicated chunk by chunk"""
+    parts, unlabelled = [], 0
+    for chunk in _read_chunks(path, [disease_col, text_col], chunksize):
+        unlabelled += int((chunk[disease_col].isna() & chunk[text_col].notna()).sum())
+        # Repeated rows are common (prognosis has every disease many times); drop them before exploding
+        chunk = chunk.dropna().drop_duplicates()
+        if chunk.empty:
+            continue
+        lists = chunk[text_col].str.split(",").tolist()
+        lengths = np.fromiter(map(len, lists), dtype=np.int64, count=len(lists))
+        token_codes, tokens = pd.factorize(np.array(list(chain.from_iterable(lists)), dtype=object))
+        disease_codes, diseases = pd.factorize(chunk[disease_col])
+        # Deduplicate on integer codes, then normalize each distinct spelling only once
+        keys = np.unique(np.repeat(disease_codes.astype(np.int64), lengths) * len(tokens) + token_codes)
+        pairs = pd.DataFrame({
+            "disease": clean_disease_series(pd.Series(diseases[keys // len(tokens)], dtype=object)),
+            "symptom": normalize_symptom_series(pd.Series(tokens[keys % len(tokens)], dtype=object)),
+        })
+        parts.append(pairs[(pairs["symptom"] != "") & (pairs["disease"] != "")].drop_duplicates())
+        # Keep memory bounded on very large inputs
+        if len(parts) >= 16:
+            parts = [pd.concat(parts, ignore_index=True).drop_duplicates()]
+    if unlabelled:
+        logger.info(f"{path}: skipped {unlabelled} rows with symptoms but no {disease_col!r}")
+    if not parts:
+        return pd.DataFrame({"disease": [], "symptom": []}, dtype=str)
+    return pd.concat(parts, ignore_index=True).drop_duplicates()
+
+
+def _narratives(path: str, disease_col: str, text_col: str, chunksize: int) -> pd.DataFrame:
+    parts = []
+    for chunk in _read_chunks(path, [disease_col, text_col], chunksize):
+        chunk = chunk.dropna()
+        parts.append(pd.DataFrame({
+            "disease": clean_disease_series(chunk[disease_col]),
+            "text": chunk[text_col].str.strip(),
+        }))
+    if not parts:
+        return pd.DataFrame({"disease": [], "text": []}, dtype=str)
+    docs = pd.concat(parts, ignore_index=True)
+    return docs[(docs["disease"] != "") & (docs["text"] != "")].drop_duplicates(ignore_index=True)
+
+
+def ingest(sources: Optional[Dict[str, dict]] = None, chunksize: int = DEFAULT_CHUNKSIZE) -> CanonicalDataset:
+    """Read every source in chunks, normalize in bulk and merge into one CanonicalDataset"""
+    sources = {name: cfg for name, cfg in (sources or DEFAULT_SOURCES).items() if os.path.exists(cfg["path"])}
+    source_names = list(sources)
+
+    pair_frames, doc_frames = [], []
+    for rank, (name, cfg) in enumerate(sources.items()):
+        if cfg["kind"] == "symptom_list":
+            frame = _symptom_pairs(cfg["path"], cfg["disease_col"], cfg["text_col"], chunksize)
+            pair_frames.append(frame.assign(source=rank))
+        else:
+            doc_frames.append(_narratives(cfg["path"], cfg["disease_col"], cfg["text_col"], chunksize).assign(source=rank))
+
+    pairs = pd.concat(pair_frames, ignore_index=True) if pair_frames else pd.DataFrame(columns=["disease", "symptom", "source"])
+    docs = pd.concat(doc_frames, ignore_index=True) if doc_frames else pd.DataFrame(columns=["disease", "text", "source"])
+
+    # Only curated symptom lists feed the (disease, symptom) relation. Narratives are
+    # indexed as documents; phrases mined from them ("body", "over", "red") are noise
+    pairs = pairs.drop_duplicates(ignore_index=True)
+
+    # Deduplicate diseases across sources by normalized key; earliest source names it
+    names = pd.concat([pairs[["disease", "source"]], docs[["disease", "source"]]], ignore_index=True)
+    names["key"] = names["disease"].str.lower()
+    names = names.sort_values("source", kind="stable").drop_duplicates("key").sort_values("key")
+    disease_ids = pd.Series(np.arange(len(names), dtype=np.int32), index=names["key"].values)
+
+    vocab = sorted(pairs["symptom"].unique())
+    symptom_ids = pd.Series(np.arange(len(vocab), dtype=np.int32), index=vocab)
+
+    dataset = CanonicalDataset(
+        diseases=list(names["disease"]),
+        vocab=vocab,
+        sources=source_names,
+        pair_disease=disease_ids.loc[pairs["disease"].str.lower()].to_numpy(np.int32),
+        pair_symptom=symptom_ids.loc[pairs["symptom"]].to_numpy(np.int32),
+        pair_source=pairs["source"].to_numpy(np.int8),
+        doc_disease=disease_ids.loc[docs["disease"].str.lower()].to_numpy(np.int32),
+        doc_source=docs["source"].to_numpy(np.int8),
+        doc_texts=list(docs["text"]),
+    )
+    logger.info(
+        f"Ingested {len(source_names)} sources - {len(dataset.diseases)} diseases, "
+        f"{len(vocab)} symptoms, {len(pairs)} pairs, {len(docs)} documents"
+    )
+    return dataset
+
+
+def build_or_load_canonical(path: str = "disease_canonical.npz", sources: Optional[Dict[str, dict]] = None) -> CanonicalDataset:
+    if os.path.exists(path):
+        return CanonicalDataset.load(path)
+    dataset = ingest(sources)
+    dataset.save(path)
+    return dataset
+
+
+def benchmark(rows: int, chunksize: int = DEFAULT_CHUNKSIZE, shuffle: bool = False) -> Dict[str, float]:
+    """
+    Ingest a synthetic ``rows``-row symptom CSV built by repeating the bundled
+    prognosis data. ``shuffle`` reorders each row's symptoms so rows are
+    (mostly) distinct and the duplicate-row shortcut does not apply.
+    """
+    seed = pd.read_csv(DEFAULT_SOURCES["prognosis"]["path"], usecols=["prognosis", "symptoms"], dtype=str).dropna()
+    repeats = -(-rows // len(seed))
+    frame = pd.concat([seed] * repeats, ignore_index=True).iloc[:rows]
+    if shuffle:
+        rng = np.random.default_rng(0)
+        frame["symptoms"] = [",".join(rng.permutation(s.split(","))) for s in frame["symptoms"]]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.csv")
+        frame.to_csv(path)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        start = time.perf_counter()
+        dataset = ingest(
+            {"bench": {"path": path, "disease_col": "prognosis", "text_col": "symptoms", "kind": "symptom_list"}},
+            chunksize=chunksize,
+        )
+        elapsed = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "distinct_rows": int(len(frame.drop_duplicates())),
+        "csv_mb": round(size_mb, 1),
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round(rows / elapsed),
+        "mb_per_second": round(size_mb / elapsed, 1),
+        "diseases": len(dataset.diseases),
+        "symptoms": len(dataset.vocab),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the canonical disease dataset from the bundled CSVs")
+    parser.add_argument("--output", default="disease_canonical.npz")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--bench", type=int, metavar="ROWS", help="measure throughput on a synthetic CSV instead")
+    parser.add_argument("--shuffle", action="store_true", help="with --bench, make synthetic rows distinct")
+    args = parser.parse_args()
+    if args.bench:
+        print(benchmark(args.bench, args.chunksize, args.shuffle))
+        return
+    start = time.perf_counter()
+    ingest(chunksize=args.chunksize).save(args.output)
+    print(f"Wrote {args.output} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
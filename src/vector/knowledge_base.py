@@ -0,0 +1,177 @@
+import json
+import logging
+import os
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.vector.ingest import (
+    DEFAULT_SOURCES,
+    CanonicalDataset,
+    build_or_load_canonical,
+    ingest,
+    normalize_disease,
+    normalize_symptom,
+)
+
+logger = logging.getLogger(__name__)
+
+KB_MAGIC = b"DKB1"
+
+# Popcount lookup for every possible byte value
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class DiseaseKnowledgeBase:
+    """
+    Compiled disease -> symptom table.
+    Every symptom is interned to an integer ID and every disease is stored as a
+    packed bitset row, so a query can be scored against all diseases at once.
+    """
+
+    def __init__(self, diseases: List[str], vocab: List[str], bitsets: np.ndarray, sizes: np.ndarray):
+        self.diseases = diseases
+        self.vocab = vocab
+        self.bitsets = bitsets
+        self.sizes = sizes
+        self.symptom_ids: Dict[str, int] = {s: i for i, s in enumerate(vocab)}
+        self.disease_ids: Dict[str, int] = {normalize_disease(d): i for i, d in enumerate(diseases)}
+
+    # ------------------------------------------------------------------ build
+
+    @classmethod
+    def from_dataset(cls, dataset: CanonicalDataset) -> "DiseaseKnowledgeBase":
+        """Compile the knowledge base from the canonical (disease, symptom) relation"""
+        n_bytes = max(1, (len(dataset.vocab) + 7) // 8)
+        bits = np.zeros((len(dataset.diseases), len(dataset.vocab)), dtype=bool)
+        bits[dataset.pair_disease, dataset.pair_symptom] = True
+        bitsets = (
+            np.packbits(bits, axis=1, bitorder="little") if len(dataset.vocab)
+            else np.zeros((len(dataset.diseases), n_bytes), dtype=np.uint8)
+        )
+        sizes = bits.sum(axis=1).astype(np.uint32)
+
+        logger.info(f"Compiled knowledge base - {len(dataset.diseases)} diseases, {len(dataset.vocab)} symptoms")
+        return cls(list(dataset.diseases), list(dataset.vocab), bitsets, sizes)
+
+    @classmethod
+    def from_csvs(
+        cls,
+        cleaned_csv: str = "Dataset_cleaned.csv",
+        prognosis_csv: str = "datasets/final_diseasevssymptoms.csv",
+        narratives_csv: str = "datasets/diseassVssymptoms1.csv",
+    ) -> "DiseaseKnowledgeBase":
+        """Compile the knowledge base straight from the bundled CSV datasets"""
+        sources = {name: dict(cfg) for name, cfg in DEFAULT_SOURCES.items()}
+        for name, path in (("conditions", cleaned_csv), ("prognosis", prognosis_csv), ("narratives", narratives_csv)):
+            sources[name]["path"] = path
+        return cls.from_dataset(ingest(sources))
+
+    # ------------------------------------------------------------ persistence
+
+    def save(self, path: str):
+        """Write the compact binary: magic, JSON header, then sizes and bitset rows"""
+        header = json.dumps({
+            "diseases": self.diseases,
+            "vocab": self.vocab,
+            "n_bytes": int(self.bitsets.shape[1]),
+        }).encode("utf-8")
+        prefix = len(KB_MAGIC) + 4 + len(header)
+        padding = (-prefix) % 8
+        with open(path, "wb") as f:
+            f.write(KB_MAGIC)
+            f.write(struct.pack("<I", len(header) + padding))
+            f.write(header + b" " * padding)
+            f.write(np.ascontiguousarray(self.sizes, dtype="<u4").tobytes())
+            f.write(np.ascontiguousarray(self.bitsets, dtype=np.uint8).tobytes())
+
+    @classmethod
+    def load(cls, path: str) -> "DiseaseKnowledgeBase":
+        """Load a compiled knowledge base; the bitset matrix is memory-mapped read-only"""
+        with open(path, "rb") as f:
+            if f.read(len(KB_MAGIC)) != KB_MAGIC:
+                raise ValueError(f"{path} is not a compiled disease knowledge base")
+            (header_len,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(header_len).decode("utf-8"))
+
+        n = len(header["diseases"])
+        offset = len(KB_MAGIC) + 4 + header_len
+        sizes = np.memmap(path, dtype="<u4", mode="r", offset=offset, shape=(n,)) if n else np.zeros(0, dtype=np.uint32)
+        offset += 4 * n
+        bitsets = (
+            np.memmap(path, dtype=np.uint8, mode="r", offset=offset, shape=(n, header["n_bytes"]))
+            if n else np.zeros((0, header["n_bytes"]), dtype=np.uint8)
+        )
+        return cls(header["diseases"], header["vocab"], bitsets, sizes)
+
+    @classmethod
+    def build_or_load(cls, kb_path: str = "disease_kb.bin", canonical_path: str = "disease_canonical.npz",
+                      sources: Optional[Dict[str, dict]] = None) -> "DiseaseKnowledgeBase":
+        if os.path.exists(kb_path):
+            return cls.load(kb_path)
+        kb = cls.from_dataset(build_or_load_canonical(canonical_path, sources))
+        kb.save(kb_path)
+        return kb
+
+    # ---------------------------------------------------------------- queries
+
+    def encode(self, symptoms: Iterable[str]) -> Tuple[np.ndarray, List[int], int]:
+        """Return (query bitset, known symptom IDs, number of distinct query symptoms)"""
+        tokens = {normalize_symptom(s) for s in symptoms}
+        tokens.discard("")
+        ids = sorted(self.symptom_ids[t] for t in tokens if t in self.symptom_ids)
+        query = np.zeros(self.bitsets.shape[1], dtype=np.uint8)
+        for i in ids:
+            query[i >> 3] |= 1 << (i & 7)
+        return query, ids, len(tokens)
+
+    def overlap(self, symptoms: Iterable[str]) -> np.ndarray:
+        """Number of query symptoms shared with every disease"""
+        query, _, _ = self.encode(symptoms)
+        return self._overlap(query)
+
+    def _overlap(self, query: np.ndarray) -> np.ndarray:
+        return _POPCOUNT[self.bitsets & query].sum(axis=1, dtype=np.int32)
+
+    def jaccard(self, symptoms: Iterable[str]) -> np.ndarray:
+        """Jaccard similarity of the query against every disease"""
+        query, _, n_query = self.encode(symptoms)
+        inter = self._overlap(query)
+        union = self.sizes.astype(np.int32) + n_query - inter
+        return np.divide(inter, union, out=np.zeros(len(inter), dtype=np.float32), where=union > 0)
+
+    def top_k(self, symptoms: Iterable[str], k: int = 5) -> List[Tuple[str, float]]:
+        scores = self.jaccard(symptoms)
+        order = np.argsort(-scores, kind="stable")[:k]
+        return [(self.diseases[i], float(scores[i])) for i in order if scores[i] > 0]
+
+    def exact_match(self, symptoms: Iterable[str], min_symptoms: int = 2) -> Optional[int]:
+        """
+        Index of the only disease that has every query symptom, or None.
+        Queries with unknown or too few symptoms never take the fast path.
+        """
+        query, ids, n_query = self.encode(symptoms)
+        if n_query < min_symptoms or len(ids) != n_query:
+            return None
+        covering = np.flatnonzero(self._overlap(query) == n_query)
+        return int(covering[0]) if len(covering) == 1 else None
+
+    def index_of(self, disease: str) -> Optional[int]:
+        return self.disease_ids.get(normalize_disease(disease))
+
+    def symptoms_of(self, index: int) -> List[str]:
+        bits = np.unpackbits(np.asarray(self.bitsets[index]), bitorder="little")[:len(self.vocab)]
+        return [self.vocab[i] for i in np.flatnonzero(bits)]
+
+    def matched_symptoms(self, symptoms: Iterable[str], index: Optional[int]) -> List[str]:
+        """Query symptoms (as given by the user) that belong to the disease at ``index``"""
+        if index is None:
+            return []
+        row = self.bitsets[index]
+        matched = []
+        for s in symptoms:
+            i = self.symptom_ids.get(normalize_symptom(s))
+            if i is not None and row[i >> 3] >> (i & 7) & 1 and s not in matched:
+                matched.append(s)
+        return matched
@@ -0,0 +1,142 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from src.vector.ingest import CanonicalDataset, ingest, normalize_symptom
+from src.vector.knowledge_base import KB_MAGIC, DiseaseKnowledgeBase
+from src.state.records import DiseaseRecord, attach_knowledge_base
+
+
+@pytest.fixture
+def sources(tmp_path):
+    conditions = tmp_path / "conditions.csv"
+    conditions.write_text(
+        ",disease,symptoms\n"
+        "0,Fungal Infection,\"itching, skin_rash,nodal_skin_eruptions\"\n"
+        "1,Common  Cold,\"cough, runny nose\"\n"
+    )
+    prognosis = tmp_path / "prognosis.csv"
+    prognosis.write_text(
+        "Unnamed: 0,prognosis,symptoms\n"
+        "0,fungal infection,\"dischromic _patches,itching\"\n"
+        "1,Common Cold,\"cough,runny_nose\"\n"
+        "2,Common Cold,\"cough,runny_nose\"\n"
+        "3,Migraine,\"headache,nausea,visual_disturbances\"\n"
+    )
+    narratives = tmp_path / "narratives.csv"
+    narratives.write_text(
+        "label,text\n"
+        "Migraine,My head hurts and I feel nausea over my whole body\n"
+    )
+    return {
+        "conditions": {"path": str(conditions), "disease_col": "disease", "text_col": "symptoms", "kind": "symptom_list"},
+        "prognosis": {"path": str(prognosis), "disease_col": "prognosis", "text_col": "symptoms", "kind": "symptom_list"},
+        "narratives": {"path": str(narratives), "disease_col": "label", "text_col": "text", "kind": "narrative"},
+    }
+
+
+@pytest.fixture
+def kb(sources):
+    return DiseaseKnowledgeBase.from_dataset(ingest(sources, chunksize=2))
+
+
+def test_normalize_symptom():
+    assert normalize_symptom("skin_rash") == "skin rash"
+    assert normalize_symptom(" dischromic _patches ") == "dischromic patches"
+
+
+def test_ingest_normalizes_and_deduplicates(sources):
+    dataset = ingest(sources, chunksize=2)
+    # Diseases merge across sources by normalized key; the first source names them
+    assert dataset.diseases == ["Common Cold", "Fungal Infection", "Migraine"]
+    assert "skin rash" in dataset.vocab and "dischromic patches" in dataset.vocab
+    assert not any("_" in s for s in dataset.vocab)
+    pairs = set(zip(dataset.pair_disease.tolist(), dataset.pair_symptom.tolist(), dataset.pair_source.tolist()))
+    assert len(pairs) == len(dataset.pair_disease)
+
+
+def test_narratives_are_documents_not_symptoms(sources):
+    dataset = ingest(sources)
+    narrative_id = dataset.sources.index("narratives")
+    assert not np.any(dataset.pair_source == narrative_id)
+    assert "over" not in dataset.vocab and "body" not in dataset.vocab
+    docs = list(dataset.documents("narratives"))
+    assert len(docs) == 1 and docs[0][1]["disease"] == "Migraine"
+
+
+def test_canonical_dataset_round_trip(sources, tmp_path):
+    dataset = ingest(sources)
+    path = str(tmp_path / "canonical.npz")
+    dataset.save(path)
+    loaded = CanonicalDataset.load(path)
+    assert loaded.diseases == dataset.diseases
+    assert loaded.vocab == dataset.vocab
+    assert loaded.doc_texts == dataset.doc_texts
+    np.testing.assert_array_equal(loaded.pair_symptom, dataset.pair_symptom)
+    assert list(loaded.documents("prognosis")) == list(dataset.documents("prognosis"))
+
+
+def test_queries(kb):
+    fungal = kb.index_of("fungal  infection")
+    assert kb.diseases[fungal] == "Fungal Infection"
+    assert kb.symptoms_of(fungal) == ["dischromic patches", "itching", "nodal skin eruptions", "skin rash"]
+    assert kb.top_k(["itching", "skin_rash", "nodal_skin_eruptions"], 1)[0][0] == "Fungal Infection"
+    assert kb.exact_match(["itching", "skin_rash"]) == fungal
+    # Unknown or too few symptoms never take the fast path
+    assert kb.exact_match(["itching"]) is None
+    assert kb.exact_match(["itching", "made up symptom"]) is None
+    assert kb.matched_symptoms(["Skin_Rash", "cough"], fungal) == ["Skin_Rash"]
+
+
+def test_save_and_memory_mapped_load(kb, tmp_path):
+    path = str(tmp_path / "kb.bin")
+    kb.save(path)
+    with open(path, "rb") as f:
+        assert f.read(len(KB_MAGIC)) == KB_MAGIC
+
+    loaded = DiseaseKnowledgeBase.load(path)
+    assert isinstance(loaded.bitsets, np.memmap)
+    assert loaded.diseases == kb.diseases and loaded.vocab == kb.vocab
+    np.testing.assert_array_equal(loaded.bitsets, kb.bitsets)
+    np.testing.assert_array_equal(loaded.sizes, kb.sizes)
+    query = ["cough", "runny nose"]
+    np.testing.assert_array_equal(loaded.jaccard(query), kb.jaccard(query))
+
+
+def test_load_rejects_other_files(tmp_path):
+    path = tmp_path / "not_a_kb.bin"
+    path.write_bytes(b"nope" + b"\0" * 16)
+    with pytest.raises(ValueError):
+        DiseaseKnowledgeBase.load(str(path))
+
+
+def test_rows_without_a_label_are_skipped(tmp_path, caplog):
+    path = tmp_path / "mixed.csv"
+    path.write_text(
+        ",prognosis,symptoms,diagnosis\n"
+        "0,Migraine,\"headache,nausea\",\n"
+        "1,,\"blood in the urine\",Migraine\n"
+    )
+    sources = {"prognosis": {"path": str(path), "disease_col": "prognosis", "text_col": "symptoms", "kind": "symptom_list"}}
+    with caplog.at_level("INFO", logger="src.vector.ingest"):
+        dataset = ingest(sources)
+    assert dataset.symptoms_by_disease("prognosis") == {0: ["headache", "nausea"]}
+    assert "skipped 1 rows" in caplog.text
+
+
+def test_pickled_records_reattach_the_shared_knowledge_base(kb):
+    fungal = kb.index_of("fungal infection")
+    record = DiseaseRecord("Fungal Infection", disease_id=fungal, matched=("itching",), kb=kb)
+    data = pickle.dumps(record)
+    # Only the record's own fields travel, not the knowledge base
+    assert len(data) < 500
+
+    attach_knowledge_base(kb)
+    try:
+        restored = pickle.loads(data)
+    finally:
+        attach_knowledge_base(None)
+    assert restored.kb is kb
+    assert restored.resolve() == record.resolve()
+    assert pickle.loads(pickle.dumps(DiseaseRecord("Unknown", source="none"))).kb is None
@@ -0,0 +1,223 @@
+import threading
+import time
+
+import pytest
+
+from src.graph.deadline import DeadlineExceeded, budget_timeout, timeout_for
+from src.tools.rate_limit import ProviderLimiter, ProviderUnavailable, call_limited, get_limiter, set_process_share
+
+
+class FakeHTTPError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"status_code": status_code, "headers": headers or {}})()
+
+
+def make_limiter(**overrides):
+    cfg = {"rate": 100.0, "burst": 100, "max_concurrency": 10, "failure_threshold": 2, "cooldown": 0.2}
+    cfg.update(overrides)
+    return ProviderLimiter("test", **cfg)
+
+
+def fail(limiter, exc):
+    with pytest.raises(type(exc)):
+        with limiter.slot(timeout=1):
+            raise exc
+
+
+def test_token_bucket_delays_requests_beyond_burst():
+    limiter = make_limiter(rate=10.0, burst=2)
+    start = time.monotonic()
+    for _ in range(3):
+        with limiter.slot(timeout=1):
+            pass
+    # Two tokens are available at once, the third refills at 10/s
+    assert time.monotonic() - start >= 0.08
+
+
+def test_concurrency_cap_times_out_waiters():
+    limiter = make_limiter(max_concurrency=1)
+    with limiter.slot(timeout=1):
+        with pytest.raises(ProviderUnavailable):
+            with limiter.slot(timeout=0.05):
+                pass
+
+
+def test_waiters_are_served_in_arrival_order():
+    limiter = make_limiter(max_concurrency=1)
+    order = []
+
+    def worker(i):
+        with limiter.slot(timeout=2):
+            order.append(i)
+
+    threads = []
+    with limiter.slot(timeout=1):
+        for i in range(5):
+            t = threading.Thread(target=worker, args=(i,))
+            t.start()
+            threads.append(t)
+            # Make sure each waiter has queued before the next one arrives
+            time.sleep(0.02)
+    for t in threads:
+        t.join()
+    assert order == list(range(5))
+
+
+def test_circuit_opens_after_consecutive_failures():
+    limiter = make_limiter()
+    fail(limiter, FakeHTTPError(500))
+    assert limiter.available()
+    fail(limiter, FakeHTTPError(503))
+    assert not limiter.available()
+    with pytest.raises(ProviderUnavailable):
+        with limiter.slot(timeout=1):
+            pass
+
+
+def test_half_open_allows_a_single_trial_then_closes_on_success():
+    limiter = make_limiter()
+    fail(limiter, FakeHTTPError(500))
+    fail(limiter, FakeHTTPError(500))
+    time.sleep(0.25)
+
+    with limiter.slot(timeout=1):
+        # A second caller cannot start while the trial is in flight
+        with pytest.raises(ProviderUnavailable):
+            with limiter.slot(timeout=0.05):
+                pass
+    # The successful trial closed the circuit
+    with limiter.slot(timeout=0.05):
+        pass
+
+
+def test_failed_half_open_trial_reopens_the_circuit():
+    limiter = make_limiter()
+    fail(limiter, FakeHTTPError(500))
+    fail(limiter, FakeHTTPError(500))
+    time.sleep(0.25)
+    fail(limiter, FakeHTTPError(500))
+    assert not limiter.available()
+
+
+def test_client_errors_do_not_count_as_failures():
+    limiter = make_limiter()
+    for _ in range(3):
+        fail(limiter, FakeHTTPError(400))
+    assert limiter.available()
+
+
+def test_retry_after_blocks_new_requests():
+    limiter = make_limiter(failure_threshold=10)
+    fail(limiter, FakeHTTPError(429, {"Retry-After": "0.2"}))
+    start = time.monotonic()
+    with limiter.slot(timeout=1):
+        pass
+    assert time.monotonic() - start >= 0.15
+
+
+def test_expired_deadline_is_not_a_provider_failure():
+    limiter = make_limiter()
+    expired = {"deadline": time.time() - 1}
+    for _ in range(5):
+        with pytest.raises(DeadlineExceeded):
+            with limiter.slot(timeout=1):
+                timeout_for(expired, 10)
+    assert limiter.available()
+    with limiter.slot(timeout=0.05):
+        pass
+
+
+def test_abandoned_call_keeps_its_slot_until_it_finishes():
+    limiter = get_limiter("test-abandoned")
+    finished = threading.Event()
+
+    def slow():
+        time.sleep(0.3)
+        finished.set()
+
+    with pytest.raises(DeadlineExceeded):
+        call_limited("test-abandoned", {"deadline": time.time() + 0.05}, slow)
+    assert limiter._in_flight == 1
+    assert finished.wait(1)
+    time.sleep(0.05)
+    assert limiter._in_flight == 0
+
+
+def test_half_open_trial_ending_at_the_deadline_frees_the_next_trial():
+    limiter = make_limiter()
+    fail(limiter, FakeHTTPError(500))
+    fail(limiter, FakeHTTPError(500))
+    time.sleep(0.25)
+
+    with pytest.raises(DeadlineExceeded):
+        with limiter.slot(timeout=1):
+            raise DeadlineExceeded("out of time")
+    # No verdict on the provider: another trial may run, and its success closes the circuit
+    with limiter.slot(timeout=0.3):
+        pass
+    with limiter.slot(timeout=0.05):
+        pass
+
+
+def test_base_exceptions_release_the_slot():
+    limiter = make_limiter(max_concurrency=1)
+    with pytest.raises(KeyboardInterrupt):
+        with limiter.slot(timeout=1):
+            raise KeyboardInterrupt
+    assert limiter._in_flight == 0
+    assert limiter.available()
+    with limiter.slot(timeout=0.05):
+        pass
+
+
+def test_timeouts_cut_short_by_the_budget_are_not_provider_failures():
+    limiter = make_limiter()
+    for _ in range(3):
+        with pytest.raises(DeadlineExceeded):
+            with limiter.slot(timeout=1):
+                with budget_timeout(0.3, 10):
+                    raise TimeoutError("read timed out")
+    assert limiter.available()
+
+    # A timeout at the full per-call cap still counts against the provider
+    for _ in range(2):
+        with pytest.raises(TimeoutError):
+            with limiter.slot(timeout=1):
+                with budget_timeout(10, 10):
+                    raise TimeoutError("read timed out")
+    assert not limiter.available()
+
+
+def test_waiter_wakes_as_soon_as_a_slot_is_released():
+    limiter = make_limiter(max_concurrency=1)
+    acquired = threading.Event()
+    waited = []
+
+    def waiter():
+        start = time.monotonic()
+        with limiter.slot(timeout=2):
+            waited.append(time.monotonic() - start)
+            acquired.set()
+
+    with limiter.slot(timeout=1):
+        t = threading.Thread(target=waiter)
+        t.start()
+        time.sleep(0.1)
+        assert not acquired.is_set()
+    assert acquired.wait(0.5)
+    t.join()
+    assert waited[0] < 0.5
+
+
+def test_process_share_splits_limits():
+    try:
+        set_process_share(0.25)
+        limiter = get_limiter("gemini")
+        assert limiter.rate == 2.5
+        assert limiter.burst == 2 and limiter.max_concurrency == 2
+        assert get_limiter("duckduckgo").max_concurrency == 1
+    finally:
+        set_process_share(1.0)
+    assert get_limiter("gemini").max_concurrency == 8
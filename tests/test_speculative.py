@@ -0,0 +1,112 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("langgraph")
+
+from src.graph.deadline import new_deadline
+from src.nodes.speculative_node import SpeculativeExecutor
+from src.state.records import DiseaseRecord
+
+
+class FakeRAG:
+    def __init__(self, score):
+        self.score = score
+
+    def predict_low_score(self, symptoms):
+        return True
+
+    def vector_search_node(self, state):
+        state["similarity_score"] = self.score
+        state["retrieved_disease"] = DiseaseRecord("Vector Guess")
+        return state
+
+
+class FakeWeb:
+    def __init__(self, release=None):
+        self.release = release
+        self.searches = 0
+        self.cancelled = []
+
+    def search_disease(self, state, cancel=None):
+        self.searches += 1
+        if self.release is not None:
+            self.release.wait(2)
+        self.cancelled.append(cancel is not None and cancel.is_set())
+        state["retrieved_disease"] = DiseaseRecord("Web Answer", source="web")
+        return state
+
+    def search_medicines(self, state):
+        state["medicines"] = ["Ibuprofen"]
+        state["medicine_snippet_id"] = 7
+        state["final_response"] = "**Related Medications Found:**\n1. Ibuprofen"
+        state["degraded"] = (state.get("degraded") or []) + ["web search cut short (time budget)"]
+        return state
+
+
+def make_state(**overrides):
+    state = {
+        "user_query": "fever and headache",
+        "extracted_symptoms": ["fever", "headache"],
+        "similarity_score": 0.0,
+        "retrieved_disease": None,
+        "refined_query": "",
+        "retry_count": 0,
+        "final_response": "",
+        "medicine_request": False,
+        "medicines": [],
+        "medicine_snippet_id": None,
+        "conversation_history": [],
+        "messages": [],
+        "deadline": new_deadline(),
+        "degraded": [],
+        "speculation_id": "",
+    }
+    state.update(overrides)
+    return state
+
+
+def test_web_search_joins_the_speculative_search():
+    web = FakeWeb()
+    spec = SpeculativeExecutor(FakeRAG(0.2), web)
+    state = spec.vector_search_node(make_state())
+    assert state["speculation_id"]
+
+    state = spec.web_search_node(state)
+    assert web.searches == 1
+    assert state["retrieved_disease"].name == "Web Answer"
+
+
+def test_good_vector_score_discards_the_speculative_search():
+    release = threading.Event()
+    web = FakeWeb(release)
+    spec = SpeculativeExecutor(FakeRAG(0.9), web)
+    state = spec.vector_search_node(make_state())
+    release.set()
+    time.sleep(0.05)
+    assert web.cancelled == [True]
+    # Nothing left to join: a later web search runs on its own
+    assert spec._take(state) is None
+
+
+def test_medicine_results_are_merged_after_the_response():
+    spec = SpeculativeExecutor(FakeRAG(0.9), FakeWeb())
+    state = spec.respond_node(make_state(medicine_request=True, retrieved_disease=DiseaseRecord("Migraine")))
+    assert state["medicines"] == ["Ibuprofen"]
+    assert state["medicine_snippet_id"] == 7
+    assert state["final_response"].startswith("**Related Medications Found:**")
+    assert state["degraded"] == ["web search cut short (time budget)"]
+
+
+def test_speculation_is_skipped_while_the_pool_is_busy():
+    release = threading.Event()
+    spec = SpeculativeExecutor(FakeRAG(0.2), FakeWeb(release), max_workers=1)
+    first = spec.vector_search_node(make_state())
+    second = spec.vector_search_node(make_state())
+    assert first["speculation_id"] and not second["speculation_id"]
+
+    # Medicine searches have their own pool and are not held up
+    done = spec.respond_node(make_state(medicine_request=True, retrieved_disease=DiseaseRecord("Migraine")))
+    assert done["medicines"] == ["Ibuprofen"]
+    release.set()